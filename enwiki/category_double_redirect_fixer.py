@@ -7,12 +7,19 @@ The following parameters are supported:
 
 -always           Don't prompt to save changes.
 
+-shutoff_edits:n  Edits between shutoff page checks. Default: 10
+
+-shutoff_interval:n
+                  Seconds between shutoff page checks. Default: 60
+
 -summary          Specify an edit aummary for the bot.
 
 &params;
 """
 # Author : JJMC89
 # License: MIT
+from time import monotonic
+
 import mwparserfromhell
 import pywikibot
 from pywikibot.bot import ExistingPageBot, SingleSiteBot
@@ -44,6 +51,59 @@ def get_template_pages(templates):
     return pages
 
 
+class ShutoffMonitor:
+    """
+    Monitor for a shutoff page.
+
+    The page's latest revision ID is checked at most once every interval
+    seconds or every edits checks (-shutoff_interval and -shutoff_edits).
+    """
+
+    def __init__(self, page, interval, edits):
+        """
+        Initializer.
+
+        @param page: shutoff page
+        @type page: L{pywikibot.Page}
+        @param interval: seconds between revision checks
+        @type interval: int
+        @param edits: checks between revision checks
+        @type edits: int
+        """
+        self.page = page
+        self.interval = interval
+        self.edits = edits
+        self.content = ''
+        self._checked = None
+        self._count = 0
+        self._revid = None
+
+    def check(self):
+        """
+        Return True if the shutoff page has content.
+
+        @rtype: bool
+        """
+        if self.content:
+            return True
+        self._count += 1
+        if (
+            self._checked is not None
+            and self._count < self.edits
+            and monotonic() - self._checked < self.interval
+        ):
+            return False
+        self._checked = monotonic()
+        self._count = 0
+        self.page.site.loadpageinfo(self.page)
+        revid = self.page.latest_revision_id if self.page.exists() else 0
+        if revid != self._revid:
+            self._revid = revid
+            if revid:
+                self.content = self.page.get(force=True).strip()
+        return bool(self.content)
+
+
 class CategoryDoubleRedirectFixerBot(SingleSiteBot, ExistingPageBot):
     """Bot to fix double (or more) category redirects."""
 
@@ -55,9 +115,16 @@ class CategoryDoubleRedirectFixerBot(SingleSiteBot, ExistingPageBot):
             pages to work
         @type generator: generator
         """
-        self.availableOptions.update({'summary': 'Fix double redirect'})
+        self.availableOptions.update(
+            {
+                'shutoff_edits': 10,
+                'shutoff_interval': 60,
+                'summary': 'Fix double redirect',
+            }
+        )
         self.generator = generator
         super().__init__(**kwargs)
+        self.shutoff_monitor = None
         self.templates = get_template_pages(
             [pywikibot.Page(self.site, 'Category redirect', ns=10)]
         )
@@ -95,12 +162,19 @@ class CategoryDoubleRedirectFixerBot(SingleSiteBot, ExistingPageBot):
                 username=self.site.user(), class_name=self.__class__.__name__
             ),
         )
-        if page.exists():
-            content = page.get(force=True).strip()
-            if content:
-                e = '{} disabled:\n{}'.format(self.__class__.__name__, content)
-                pywikibot.error(e)
-                self.quit()
+        if self.shutoff_monitor is None:
+            self.shutoff_monitor = ShutoffMonitor(
+                page,
+                interval=self.getOption('shutoff_interval'),
+                edits=self.getOption('shutoff_edits'),
+            )
+        monitor = self.shutoff_monitor
+        if monitor.check():
+            e = '{} disabled:\n{}'.format(
+                self.__class__.__name__, monitor.content
+            )
+            pywikibot.error(e)
+            self.quit()
 
     def treat_page(self):
         """Process one page."""
@@ -158,6 +232,14 @@ def main(*args):
                     'Please enter a value for {}'.format(arg), default=None
                 )
             options[arg] = value
+        elif arg in ('shutoff_edits', 'shutoff_interval'):
+            try:
+                options[arg] = int(value)
+            except ValueError:
+                options[arg] = 0
+            if options[arg] < 1:
+                pywikibot.error('-{} must be a positive integer.'.format(arg))
+                return False
         else:
             options[arg] = True
     gen = gen_factory.getCombinedGenerator(preload=True)
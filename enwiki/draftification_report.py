@@ -13,24 +13,35 @@ The following arguments are supported:
 -end              The end date of the range for the report.
                   If -end is not provided, it will be yesterday.
 
+-file             A local file to also write the report to.
+
 -start            The start date of the range for the report.
                   If -start is not provided, it will be the same as -end.
+
+-workers          The number of log events to look up concurrently.
+                  If -workers is not provided, it will be 4.
 """
 # Author : JJMC89
 # License: MIT
 import datetime
+import io
+import json
 import re
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
+from functools import partial
 
 import pywikibot
 from dateutil.parser import parse as parse_date
-from pywikibot.pagegenerators import PrefixingPageGenerator
+from pywikibot.data.api import PropertyGenerator
+from pywikibot.tools import itergroup
 
 
-BOT_START_END = re.compile(
-    r'^(.*?<!--\s*bot start\s*-->).*?(<!--\s*bot end\s*-->.*)$',
-    flags=re.S | re.I,
-)
+BOT_END = re.compile(r'<!--\s*bot end\s*-->', flags=re.I)
+BOT_START = re.compile(r'<!--\s*bot start\s*-->', flags=re.I)
+XFD_INDEX_MAX_AGE = timedelta(days=30)
+XFD_PREFIXES = ('Articles for deletion/', 'Miscellany for deletion/')
 
 
 def validate_options(options, site):
@@ -64,6 +75,14 @@ def validate_options(options, site):
                 pywikibot.log('Must be a string.')
                 result = False
             options[key] = pywikibot.Page(site, value)
+        elif key == 'workers':
+            try:
+                options[key] = int(value)
+            except (TypeError, ValueError):
+                options[key] = 0
+            if options[key] < 1:
+                pywikibot.log('Must be a positive integer.')
+                result = False
         pywikibot.log('\u2192{} = {}'.format(key, options[key]))
     if sorted(has_keys) != sorted(required_keys):
         pywikibot.log('Missing one more required keys.')
@@ -74,27 +93,323 @@ def validate_options(options, site):
     return result
 
 
-def get_xfds(pages):
+class XfdIndex:
+    """
+    Sorted index of XfD page titles, cached on disk between runs.
+
+    The cached index is refreshed from the creation log since it was last
+    saved. It is rebuilt from scratch once it is older than
+    XFD_INDEX_MAX_AGE to pick up moves and deletions.
+    """
+
+    def __init__(self, site):
+        """
+        Initializer.
+
+        @param site: site of the XfD pages
+        @type site: L{pywikibot.site.APISite}
+        """
+        self.site = site
+        self.filename = pywikibot.config.datafilepath(
+            'draftification_report', '{}-xfds.json'.format(site.dbName())
+        )
+        self.built = self.timestamp = None
+        self.titles = list()
+
+    def __contains__(self, title):
+        """Return True if the title is in the index."""
+        i = bisect_left(self.titles, title)
+        return i < len(self.titles) and self.titles[i] == title
+
+    def load(self):
+        """Load the index from the cache and bring it up to date."""
+        try:
+            with open(self.filename, encoding='utf-8') as f:
+                data = json.load(f)
+            self.built = pywikibot.Timestamp.fromISOformat(data['built'])
+            self.timestamp = pywikibot.Timestamp.fromISOformat(
+                data['timestamp']
+            )
+            self.titles = data['titles']
+        except (OSError, KeyError, ValueError) as e:
+            pywikibot.log('XfD index cache not loaded: {}'.format(e))
+            self.built = None
+        timestamp = self.site.server_time()
+        if self.built is None or timestamp - self.built > XFD_INDEX_MAX_AGE:
+            self.build()
+            self.built = timestamp
+        else:
+            self.refresh()
+        self.timestamp = timestamp
+        self.save()
+
+    def build(self):
+        """Build the index from all XfD pages."""
+        titles = set()
+        for prefix in XFD_PREFIXES:
+            for xfd_page in self.site.allpages(prefix=prefix, namespace=4):
+                titles.add(xfd_page.title(with_ns=False))
+        self.titles = sorted(titles)
+
+    def refresh(self):
+        """Add XfD pages created since the index was last saved."""
+        for logevent in self.site.logevents(
+            logtype='create', namespace=4, start=self.timestamp, reverse=True
+        ):
+            try:
+                title = logevent.page().title(with_ns=False)
+            except KeyError:
+                continue
+            if title.startswith(XFD_PREFIXES) and title not in self:
+                insort(self.titles, title)
+
+    def save(self):
+        """Save the index to the cache."""
+        data = {
+            'built': self.built.isoformat(),
+            'timestamp': self.timestamp.isoformat(),
+            'titles': self.titles,
+        }
+        try:
+            with open(self.filename, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        except OSError as e:
+            pywikibot.log('XfD index cache not saved: {}'.format(e))
+
+    def search(self, prefix):
+        """
+        Return the titles starting with the prefix.
+
+        @param prefix: title prefix
+        @type prefix: str
+
+        @rtype: list
+        """
+        titles = list()
+        i = bisect_left(self.titles, prefix)
+        while i < len(self.titles) and self.titles[i].startswith(prefix):
+            titles.append(self.titles[i])
+            i += 1
+        return titles
+
+
+class ReportCache:
+    """
+    Report rows cached on disk, one file per day of log events.
+
+    Each row is stored with the latest revision IDs of the pages it was built
+    from, so it is only rebuilt once one of those pages changes.
+    """
+
+    def __init__(self, site):
+        """
+        Initializer.
+
+        @param site: site of the log events
+        @type site: L{pywikibot.site.APISite}
+        """
+        self.site = site
+        self.days = dict()
+        self.changed = set()
+
+    def _filename(self, day):
+        """Return the cache file name for the day."""
+        return pywikibot.config.datafilepath(
+            'draftification_report',
+            '{}-{}.json'.format(self.site.dbName(), day),
+        )
+
+    def _load_day(self, logevent):
+        """Load the cached rows for the log event's day and return the day."""
+        day = logevent.timestamp().date().isoformat()
+        if day not in self.days:
+            try:
+                with open(self._filename(day), encoding='utf-8') as f:
+                    self.days[day] = json.load(f)
+            except (OSError, ValueError) as e:
+                pywikibot.log('Report cache not loaded: {}'.format(e))
+                self.days[day] = dict()
+        return day
+
+    def get(self, logevent):
+        """
+        Return the cached row and its revision IDs for the log event.
+
+        @param logevent: Move log event
+        @type logevent: L{pywikibot.logentries.MoveEntry}
+
+        @rtype: dict or None
+        """
+        day = self._load_day(logevent)
+        return self.days[day].get(str(logevent.logid()))
+
+    def set(self, logevent, revids, row):
+        """
+        Cache the row and its revision IDs for the log event.
+
+        @param logevent: Move log event
+        @type logevent: L{pywikibot.logentries.MoveEntry}
+        @param revids: Latest revision IDs keyed by title
+        @type revids: dict
+        @param row: Row fields
+        @type row: dict
+        """
+        day = self._load_day(logevent)
+        self.days[day][str(logevent.logid())] = {'revids': revids, 'row': row}
+        self.changed.add(day)
+
+    def save(self):
+        """Save the changed days to the cache."""
+        for day in self.changed:
+            try:
+                with open(self._filename(day), 'w', encoding='utf-8') as f:
+                    json.dump(self.days[day], f, ensure_ascii=False)
+            except OSError as e:
+                pywikibot.log('Report cache not saved: {}'.format(e))
+        self.changed.clear()
+
+
+def get_xfds(pages, xfd_index):
     """
     Return a set of XfDs for the pages.
 
     @param pages: Pages to get XfDs for
     @type pages: iterable of L{pywikibot.Page}
+    @param xfd_index: Index of XfD page titles
+    @type xfd_index: L{XfdIndex}
 
     @rtype: set
     """
     xfds = set()
     for page in pages:
         if page.namespace() == page.site.namespaces.MAIN:
-            prefix = 'Articles for deletion/'
+            prefix = XFD_PREFIXES[0]
         else:
-            prefix = 'Miscellany for deletion/'
+            prefix = XFD_PREFIXES[1]
         prefix += page.title()
-        gen = PrefixingPageGenerator(prefix, namespace=4, site=page.site)
-        xfds = xfds.union([xfd_page.title(asLink=True) for xfd_page in gen])
+        for title in xfd_index.search(prefix):
+            xfd_page = pywikibot.Page(page.site, title, ns=4)
+            xfds.add(xfd_page.title(asLink=True))
     return xfds
 
 
+def get_current_page(logevent):
+    """
+    Return the current page for the move log event.
+
+    @param logevent: Move log event
+    @type logevent: L{pywikibot.logentries.MoveEntry}
+
+    @rtype: L{pywikibot.Page} or None
+    """
+    if logevent.target_page.exists():
+        current_page = logevent.target_page
+        if current_page.isRedirectPage():
+            try:
+                redirect_target = current_page.getRedirectTarget()
+            except pywikibot.CircularRedirect:
+                pywikibot.log(
+                    '{} is a circular redirect.'.format(
+                        current_page.title(asLink=True)
+                    )
+                )
+            else:
+                if redirect_target.exists() and (
+                    redirect_target.namespace() in (0, 2, 118)
+                ):
+                    current_page = redirect_target
+        return current_page
+    if logevent.page().exists():
+        return logevent.page()
+    return None
+
+
+def get_latest_revids(site, titles, executor=None):
+    """
+    Return the latest revision IDs for the titles, queried in batches.
+
+    Titles of pages that do not exist have a revision ID of 0.
+
+    @param site: Site of the pages
+    @type site: L{pywikibot.site.APISite}
+    @param titles: Normalized titles
+    @type titles: iterable of str
+    @param executor: Executor to run the requests with
+    @type executor: L{concurrent.futures.Executor} or None
+
+    @rtype: dict
+    """
+    map_ = executor.map if executor else map
+    revids = dict()
+    for batch_revids in map_(
+        partial(_get_batch_revids, site), itergroup(sorted(titles), 50)
+    ):
+        revids.update(batch_revids)
+    return revids
+
+
+def _get_batch_revids(site, titles):
+    """Return the latest revision IDs for the titles."""
+    revids = dict.fromkeys(titles, 0)
+    gen = PropertyGenerator('info', site=site, parameters={'titles': titles})
+    for data in gen:
+        revids[data['title']] = data.get('lastrevid', 0)
+    return revids
+
+
+def get_revision_details(pages, executor=None):
+    """
+    Return revision details for the pages.
+
+    The latest revision and the contributors are queried for 50 pages per
+    request. The oldest revision still needs one request per page since the
+    API only allows the revision direction to be set for a single page.
+
+    @param pages: Pages to get details for
+    @type pages: list of L{pywikibot.Page}
+    @param executor: Executor to run the requests with
+    @type executor: L{concurrent.futures.Executor} or None
+
+    @return: oldest revision, latest revision, and number of editors keyed
+        by page
+    @rtype: dict
+    """
+    map_ = executor.map if executor else map
+    details = dict()
+    for batch_details in map_(_get_batch_details, itergroup(pages, 50)):
+        details.update(batch_details)
+    pages = [page for page in pages if page in details]
+    for page, oldest in zip(
+        pages, map_(lambda page: page.oldest_revision, pages)
+    ):
+        details[page]['oldest'] = oldest
+    return details
+
+
+def _get_batch_details(pages):
+    """Return the latest revision and number of editors for the pages."""
+    details = dict()
+    site = pages[0].site
+    gen = PropertyGenerator(
+        'revisions|contributors',
+        site=site,
+        parameters={
+            'titles': [page.title() for page in pages],
+            'rvprop': 'ids|timestamp|user',
+            'pclimit': 'max',
+        },
+    )
+    for data in gen:
+        if 'missing' in data or 'revisions' not in data:
+            continue
+        details[pywikibot.Page(site, data['title'])] = {
+            'latest': data['revisions'][0],
+            'editors': len(data.get('contributors', []))
+            + data.get('anoncontributors', 0),
+        }
+    return details
+
+
 def iterable_to_wikitext(items):
     """
     Convert iterable to wikitext.
@@ -106,10 +421,7 @@ def iterable_to_wikitext(items):
     """
     if len(items) == 1:
         return '{}'.format(next(iter(items)))
-    text = ''
-    for item in items:
-        text += '\n* {}'.format(item)
-    return text
+    return ''.join('\n* {}'.format(item) for item in items)
 
 
 def save_bot_start_end(save_text, page, summary):
@@ -125,9 +437,12 @@ def save_bot_start_end(save_text, page, summary):
     """
     save_text = save_text.strip()
     if page.exists():
-        if BOT_START_END.match(page.text):
-            page.text = BOT_START_END.sub(
-                r'\1\n{}\2'.format(save_text), page.text
+        text = page.text
+        bot_start = BOT_START.search(text)
+        bot_end = bot_start and BOT_END.search(text, bot_start.end())
+        if bot_end:
+            page.text = '{}\n{}{}'.format(
+                text[:bot_start.end()], save_text, text[bot_end.start():]
             )
         else:
             page.text = save_text
@@ -136,14 +451,66 @@ def save_bot_start_end(save_text, page, summary):
         pywikibot.error('{} does not exist. Skipping.'.format(page.title()))
 
 
-def output_move_log(page=None, start=None, end=None):
+def write_move_log(stream, logevents, rows, xfd_index, caption):
+    """
+    Write the move log table to a stream one row at a time.
+
+    @param stream: Text stream to write to
+    @type stream: L{io.TextIOBase}
+    @param logevents: Move log events
+    @type logevents: list of L{pywikibot.logentries.MoveEntry}
+    @param rows: Row fields keyed by log ID
+    @type rows: dict
+    @param xfd_index: Index of XfD page titles
+    @type xfd_index: L{XfdIndex}
+    @param caption: Table caption
+    @type caption: str
+    """
+    stream.write(
+        '\n{{| class="wikitable sortable plainlinks"\n|+ {caption}'
+        '\n! Page !! Target !! Mover !! Move date/time !! Move summary !! '
+        'Creator !! Creation !! Editors !! Last edit !! Notes'
+        .format(caption=caption)
+    )
+    for logevent in logevents:
+        stream.write(
+            '\n|-\n| {page} || {target} || [[User:{log[user]}]] || '
+            '{log[timestamp]} || <nowiki>{log[comment]}</nowiki> || '
+            '{row[creator]} || {row[creation]} || {row[editors]} || '
+            '{row[last_edit]} || {notes}'
+            .format(
+                page=logevent.page().title(asLink=True, textlink=True),
+                target=logevent.target_page.title(asLink=True, textlink=True),
+                log=logevent.data,
+                row=rows[logevent.logid()],
+                notes=iterable_to_wikitext(
+                    get_xfds(
+                        [logevent.page(), logevent.target_page], xfd_index
+                    )
+                ),
+            )
+        )
+    stream.write('\n|}')
+
+
+def output_move_log(
+    page=None, start=None, end=None, workers=1, filename=None
+):
     """
     Writes move logevents to a page.
 
+    Log events are looked up concurrently, but the report keeps the order
+    of the log. Rows are reused from L{ReportCache} unless one of the pages
+    they were built from has been edited since.
+
     @param page: The page to output to
     @type page: L{pywikibot.Page}
+    @param workers: The number of log events to look up concurrently
+    @type workers: int
+    @param filename: A local file to also write the report to
+    @type filename: str or None
     """
-    text = ''
+    logevents = list()
     for logevent in page.site.logevents(
         logtype='move',
         namespace=page.site.namespaces.MAIN.id,
@@ -158,59 +525,68 @@ def output_move_log(page=None, start=None, end=None):
             # Only want moves to Draft or User.
             # Skip page swaps.
             continue
-        current_page = None
-        creator = creation = last_edit = num_editors = '(Unknown)'
-        if logevent.target_page.exists():
-            current_page = logevent.target_page
-            if current_page.isRedirectPage():
-                try:
-                    redirect_target = current_page.getRedirectTarget()
-                except pywikibot.CircularRedirect:
-                    pywikibot.log(
-                        '{} is a circular redirect.'.format(
-                            current_page.title(asLink=True)
-                        )
-                    )
-                else:
-                    if redirect_target.exists() and (
-                        redirect_target.namespace() in (0, 2, 118)
-                    ):
-                        current_page = redirect_target
-        elif logevent.page().exists():
-            current_page = logevent.page()
-        if current_page:
-            if current_page.oldest_revision.user:
-                creator = '[[User:{}]]'.format(
-                    current_page.oldest_revision.user
-                )
-            creation = ('[[Special:PermaLink/{rev.revid}|{rev.timestamp}]]'
-                        .format(rev=current_page.oldest_revision))
-            last_edit = '[[Special:Diff/{rev.revid}|{rev.timestamp}]]'.format(
-                rev=current_page.latest_revision
+        logevents.append(logevent)
+    cache = ReportCache(page.site)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        titles = set()
+        for logevent in logevents:
+            titles.add(logevent.page().title())
+            titles.add(logevent.target_page.title())
+            entry = cache.get(logevent)
+            if entry:
+                titles.update(entry['revids'])
+        revids = get_latest_revids(page.site, titles, executor=executor)
+        rows = dict()
+        stale = list()
+        for logevent in logevents:
+            entry = cache.get(logevent)
+            if entry and all(
+                revids.get(title) == revid
+                for title, revid in entry['revids'].items()
+            ):
+                rows[logevent.logid()] = entry['row']
+            else:
+                stale.append(logevent)
+        pywikibot.log(
+            'Using {} of {} cached rows.'.format(len(rows), len(logevents))
+        )
+        current_pages = list(executor.map(get_current_page, stale))
+        details = get_revision_details(
+            list(set(filter(None, current_pages))), executor=executor
+        )
+    for logevent, current_page in zip(stale, current_pages):
+        row = dict.fromkeys(
+            ('creator', 'creation', 'editors', 'last_edit'), '(Unknown)'
+        )
+        row_revids = {
+            title: revids[title]
+            for title in (
+                logevent.page().title(),
+                logevent.target_page.title(),
             )
-            editors = set()
-            for rev in current_page.revisions():
-                if rev.user:
-                    editors.add(rev.user)
-            num_editors = len(editors)
-        text += (
-            '\n|-\n| {page} || {target} || [[User:{log[user]}]] || '
-            '{log[timestamp]} || <nowiki>{log[comment]}</nowiki> || '
-            '{creator} || {creation} || {editors} || {last_edit} || {notes}'
-            .format(
-                page=logevent.page().title(asLink=True, textlink=True),
-                target=logevent.target_page.title(asLink=True, textlink=True),
-                log=logevent.data,
-                creator=creator,
-                creation=creation,
-                editors=num_editors,
-                last_edit=last_edit,
-                notes=iterable_to_wikitext(
-                    get_xfds([logevent.page(), logevent.target_page])
-                ),
+        }
+        if current_page in details:
+            oldest = details[current_page]['oldest']
+            latest = details[current_page]['latest']
+            if oldest.user:
+                row['creator'] = '[[User:{}]]'.format(oldest.user)
+            row['creation'] = (
+                '[[Special:PermaLink/{rev.revid}|{rev.timestamp}]]'
+                .format(rev=oldest)
             )
-        )
-    if text:
+            row['last_edit'] = (
+                '[[Special:Diff/{rev[revid]}|{rev[timestamp]}]]'
+                .format(rev=latest)
+            )
+            row['editors'] = details[current_page]['editors']
+            row_revids[current_page.title()] = latest['revid']
+        cache.set(logevent, row_revids, row)
+        rows[logevent.logid()] = row
+    cache.save()
+    buffer = io.StringIO()
+    if logevents:
+        xfd_index = XfdIndex(page.site)
+        xfd_index.load()
         if start.date() == end.date():
             caption = 'Report for {}'.format(start.date().isoformat())
         else:
@@ -218,14 +594,13 @@ def output_move_log(page=None, start=None, end=None):
                 start.date().isoformat(), end.date().isoformat()
             )
         caption += '; Last updated: ~~~~~'
-        text = (
-            '\n{{| class="wikitable sortable plainlinks"\n|+ {caption}'
-            '\n! Page !! Target !! Mover !! Move date/time !! Move summary !! '
-            'Creator !! Creation !! Editors !! Last edit !! Notes{body}\n|}}'
-            .format(caption=caption, body=text)
-        )
+        write_move_log(buffer, logevents, rows, xfd_index, caption)
     else:
-        text = 'None'
+        buffer.write('None')
+    text = buffer.getvalue()
+    if filename:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(text)
     save_bot_start_end(text, page, 'Updating draftification report')
 
 
@@ -236,7 +611,7 @@ def main(*args):
     @param args: command line arguments
     @type args: list of unicode
     """
-    options = {'end': date.today() - timedelta(days=1)}
+    options = {'end': date.today() - timedelta(days=1), 'workers': 4}
     # Process global arguments
     local_args = pywikibot.handle_args(args)
     site = pywikibot.Site()
@@ -245,7 +620,7 @@ def main(*args):
     for arg in local_args:
         arg, _, value = arg.partition(':')
         arg = arg[1:]
-        if arg in 'end' 'page' 'start':
+        if arg in 'end' 'file' 'page' 'start' 'workers':
             if not value:
                 value = pywikibot.input(
                     'Please enter a value for {}'.format(arg), default=None
@@ -262,6 +637,8 @@ def main(*args):
         page=options['page'],
         start=datetime.datetime.combine(options['start'], datetime.time.min),
         end=datetime.datetime.combine(options['end'], datetime.time.max),
+        workers=options['workers'],
+        filename=options.get('file'),
     )
     return True
 
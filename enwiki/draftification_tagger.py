@@ -3,8 +3,19 @@
 # Author : JJMC89
 # License: MIT
 import argparse
+import json
 import re
-from typing import Any, Dict, FrozenSet, Generator, Iterable, Optional, Union
+from time import monotonic
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Generator,
+    Iterable,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import pywikibot
 from pywikibot.bot import (
@@ -14,6 +25,7 @@ from pywikibot.bot import (
     SingleSiteBot,
 )
 from pywikibot.pagegenerators import GeneratorFactory, parameterHelp
+from pywikibot.tools import itergroup
 
 
 # Cache for get_redirects().
@@ -65,6 +77,59 @@ def has_template(
     return bool(templates & set(page.templates()))
 
 
+class ShutoffMonitor:
+    """
+    Monitor for a shutoff page.
+
+    The latest revision ID is checked every --shutoff-interval seconds or
+    every --shutoff-edits checks, whichever comes first, and the content
+    is only fetched when it changes. This matters with --follow, where
+    the bot can run for days.
+    """
+
+    def __init__(
+        self,
+        page: pywikibot.Page,
+        interval: int,
+        edits: int,
+    ) -> None:
+        """
+        Initializer.
+
+        @param page: shutoff page
+        @param interval: seconds between revision checks
+        @param edits: checks between revision checks
+        """
+        self.page = page
+        self.interval = interval
+        self.edits = edits
+        self.content = ''
+        self._checked = None  # type: Optional[float]
+        self._count = 0
+        self._revid = None  # type: Optional[int]
+
+    def check(self) -> bool:
+        """Return True if the shutoff page has content."""
+        if self.content:
+            return True
+        self._count += 1
+        if (
+            self._checked is not None
+            and self._count < self.edits
+            and monotonic() - self._checked < self.interval
+        ):
+            return False
+        self._checked = monotonic()
+        self._count = 0
+        self.page.site.loadpageinfo(self.page)
+        revid = self.page.latest_revision_id if self.page.exists() else 0
+        if revid != self._revid:
+            self._revid = revid
+            if revid:
+                self.content = self.page.get(force=True).strip()
+        return bool(self.content)
+
+
 class DfyTaggerBot(SingleSiteBot, ExistingPageBot, NoRedirectPageBot):
     """Bot to tag draftified articles."""
 
@@ -72,11 +137,14 @@ class DfyTaggerBot(SingleSiteBot, ExistingPageBot, NoRedirectPageBot):
         """Initialize."""
         self.available_options.update(  # pylint: disable=no-member
             {
+                'shutoff_edits': 10,
+                'shutoff_interval': 60,
                 'summary': 'Add {{{{{tpl}}}}}',
                 'template': 'drafts moved from mainspace',
             }
         )
         super().__init__(**kwargs)
+        self.shutoff_monitor = None  # type: Optional[ShutoffMonitor]
         template = self.opt.template
         self.add_text = '\n\n{{{{subst:{tpl}}}}}'.format(tpl=template)
         self.summary = self.opt.summary.format(tpl=template)
@@ -98,11 +166,18 @@ class DfyTaggerBot(SingleSiteBot, ExistingPageBot, NoRedirectPageBot):
             self.site,
             'User:{}/shutoff/{}.json'.format(self.site.username(), class_name),
         )
-        if page.exists():
-            content = page.get(force=True).strip()
-            if content:
-                pywikibot.error('{} disabled:\n{}'.format(class_name, content))
-                self.quit()
+        if self.shutoff_monitor is None:
+            self.shutoff_monitor = ShutoffMonitor(
+                page,
+                interval=self.opt.shutoff_interval,
+                edits=self.opt.shutoff_edits,
+            )
+        monitor = self.shutoff_monitor
+        if monitor.check():
+            pywikibot.error(
+                '{} disabled:\n{}'.format(class_name, monitor.content)
+            )
+            self.quit()
 
     def treat_page(self) -> None:
         """Process one page."""
@@ -113,20 +188,89 @@ class DfyTaggerBot(SingleSiteBot, ExistingPageBot, NoRedirectPageBot):
         )
 
 
+def load_cursor(
+    filename: str,
+) -> Tuple[Optional[int], Optional[pywikibot.Timestamp]]:
+    """
+    Return the last processed log ID and timestamp from the state file.
+
+    @param filename: state file to read
+    """
+    try:
+        with open(filename, encoding='utf-8') as f:
+            state = json.load(f)
+        return (
+            int(state['logid']),
+            pywikibot.Timestamp.fromISOformat(state['timestamp']),
+        )
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        pywikibot.log('Log cursor not loaded: {}'.format(e))
+        return None, None
+
+
+def save_cursor(
+    filename: str, logid: int, timestamp: pywikibot.Timestamp
+) -> None:
+    """
+    Save the last processed log ID and timestamp to the state file.
+
+    @param filename: state file to write
+    @param logid: last processed log ID
+    @param timestamp: timestamp of the last processed log ID
+    """
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'logid': logid, 'timestamp': timestamp.isoformat()}, f)
+    except OSError as e:
+        pywikibot.log('Log cursor not saved: {}'.format(e))
+
+
 def draftified_page_generator(
-    site: pywikibot.site.BaseSite, start: Optional[pywikibot.Timestamp],
+    site: pywikibot.site.BaseSite,
+    start: Optional[pywikibot.Timestamp],
+    state_file: Optional[str] = None,
+    follow: bool = False,
+    interval: int = 300,
 ) -> Generator[pywikibot.Page, None, None]:
     """
     Yield draftified pages based on page moves.
 
+    Pages are preloaded with their templates in batches. The log cursor is
+    saved once every page of a batch has been processed, so a later run
+    resumes after the last complete batch.
+
     @param site: site to yield page moves from
+    @param start: timestamp to start from instead of the saved log cursor
+    @param state_file: file to load and save the log cursor
+    @param follow: keep polling for page moves
+    @param interval: seconds to wait between polls
     """
-    gen = site.logevents(
-        logtype='move', namespace=0, start=start, reverse=True
-    )
-    for move in gen:
-        if move.target_ns == 118:
-            yield move.target_page
+    last_logid = None
+    if state_file:
+        last_logid, timestamp = load_cursor(state_file)
+        if start is None:
+            start = timestamp
+        else:
+            last_logid = None
+    while True:
+        gen = site.logevents(
+            logtype='move', namespace=0, start=start, reverse=True
+        )
+        for moves in itergroup(gen, 50):
+            pages = list()
+            for move in moves:
+                if last_logid is not None and move.logid() <= last_logid:
+                    continue
+                if move.target_ns == 118:
+                    pages.append(move.target_page)
+            yield from site.preloadpages(pages, templates=True)
+            last_logid = moves[-1].logid()
+            start = moves[-1].timestamp()
+            if state_file:
+                save_cursor(state_file, last_logid, start)
+        if not follow:
+            break
+        pywikibot.sleep(interval)
 
 
 def main(*args: str) -> None:
@@ -156,9 +300,37 @@ def main(*args: str) -> None:
     parser.add_argument(
         '--start',
         type=pywikibot.Timestamp.fromISOformat,
-        help='Timestampt to start from',
+        help='Timestampt to start from instead of the saved log cursor',
         metavar='%Y-%m-%dT%H:%M:%SZ',
     )
+    parser.add_argument(
+        '--state',
+        help='File to save the log cursor in',
+        metavar='FILE',
+    )
+    parser.add_argument(
+        '--follow',
+        action='store_true',
+        help='Keep polling for page moves',
+    )
+    parser.add_argument(
+        '--interval',
+        type=int,
+        default=300,
+        help='Seconds to wait between polls with --follow',
+    )
+    parser.add_argument(
+        '--shutoff-edits',
+        type=int,
+        default=argparse.SUPPRESS,
+        help='Checks between shutoff page revision checks',
+    )
+    parser.add_argument(
+        '--shutoff-interval',
+        type=int,
+        default=argparse.SUPPRESS,
+        help='Seconds between shutoff page revision checks',
+    )
     parser.add_argument(
         '--summary', help='Edit aummary for the bot', default=argparse.SUPPRESS
     )
@@ -167,8 +339,21 @@ def main(*args: str) -> None:
     )
     parsed_args = vars(parser.parse_args(args=script_args))
     start = parsed_args.pop('start')
-    gen = None if gen_factory.gens else draftified_page_generator(site, start)
-    gen = gen_factory.getCombinedGenerator(gen=gen, preload=True)
+    state_file = parsed_args.pop('state') or pywikibot.config.datafilepath(
+        'draftification_tagger-{}.json'.format(site.dbName())
+    )
+    follow = parsed_args.pop('follow')
+    interval = parsed_args.pop('interval')
+    if gen_factory.gens:
+        gen = gen_factory.getCombinedGenerator()
+        # Preload templates with the text so skip_page needs no requests.
+        gen = site.preloadpages(gen, templates=True)
+    else:
+        gen = gen_factory.getCombinedGenerator(
+            gen=draftified_page_generator(
+                site, start, state_file, follow=follow, interval=interval
+            )
+        )
     DfyTaggerBot(generator=gen, site=site, **parsed_args).run()
 
 
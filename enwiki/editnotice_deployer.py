@@ -27,6 +27,8 @@ import mwparserfromhell
 import pywikibot
 from pywikibot import pagegenerators
 from pywikibot.bot import CurrentPageBot, SingleSiteBot
+from pywikibot.data.api import PropertyGenerator
+from pywikibot.tools import itergroup
 
 
 docuReplacements = {  # pylint: disable=invalid-name
@@ -112,15 +114,52 @@ def talk_page_generator(generator):
             yield page
 
 
-def editnotice_page_generator(generator):
+def get_deployed_titles(editnotice_page):
+    """
+    Return titles of editnotices that already transclude the template.
+
+    @param editnotice_page: the editnotice template
+    @type editnotice_page: L{pywikibot.Page}
+
+    @rtype: frozenset
+    """
+    titles = set()
+    for page in editnotice_page.embeddedin(namespaces=10):
+        if page.title(with_ns=False).startswith('Editnotices/'):
+            titles.add(page.title())
+    return frozenset(titles)
+
+
+def editnotice_page_generator(generator, groupsize=50, exclude=frozenset()):
     """Yield editnotice pages for existing, non-redirect pages from another
-    generator."""
-    for page in generator:
-        if page.exists() and not page.isRedirectPage():
-            title = page.title(withSection=False)
-            editnotice_title = 'Template:Editnotices/Page/{}'.format(title)
-            editnotice_page = pywikibot.Page(page.site, editnotice_title)
-            yield editnotice_page
+    generator.
+
+    Editnotices in exclude are dropped before any request is made.
+    Existence and redirect status are queried for groupsize pages at once.
+    """
+    pages = ((page, page.title(withSection=False)) for page in generator)
+    pages = (
+        (page, title)
+        for page, title in pages
+        if 'Template:Editnotices/Page/{}'.format(title) not in exclude
+    )
+    for batch in itergroup(pages, groupsize):
+        gen = PropertyGenerator(
+            'info',
+            site=batch[0][0].site,
+            parameters={'titles': [title for _, title in batch]},
+        )
+        existing = set()
+        for data in gen:
+            if not ({'invalid', 'missing', 'redirect'} & set(data)):
+                existing.add(data['title'])
+        for page, title in batch:
+            if title in existing:
+                editnotice_title = 'Template:Editnotices/Page/{}'.format(
+                    title
+                )
+                editnotice_page = pywikibot.Page(page.site, editnotice_title)
+                yield editnotice_page
 
 
 class EditnoticeDeployer(SingleSiteBot, CurrentPageBot):
@@ -230,7 +269,11 @@ def main(*args):
         gen = subject_page_generator(gen)
     elif options['talk_only']:
         gen = talk_page_generator(gen)
-    gen = editnotice_page_generator(gen)
+    gen = editnotice_page_generator(
+        gen,
+        groupsize=500 if site.has_right('apihighlimits') else 50,
+        exclude=get_deployed_titles(options['editnotice_page']),
+    )
     for key in ('subject_only', 'talk_only', 'to_subject', 'to_talk'):
         options.pop(key, None)
     gen = pagegenerators.PreloadingGenerator(gen)
@@ -42,6 +42,42 @@ docuReplacements = {
 }
 
 HTMLCOMMENT = re.compile(r'<!--.*?-->', flags=re.DOTALL)
+TITLESPACE = re.compile(r'[_\s]+')
+PARAMSPACING = re.compile(r'\n( *)\|\s*(\S+)(\s*)=')
+SPACINGEND = re.compile(r'\s*(\||\}\})')
+
+
+def normalize_template_name(name):
+    """
+    Normalize a template name and return it.
+
+    Comments are removed, runs of underscores and whitespace become a
+    single space, and the first letter is uppercased.
+
+    @param name: template name
+    @type name: str
+    @rtype: str
+    """
+    if '<!--' in name:
+        name = HTMLCOMMENT.sub('', name)
+    name = TITLESPACE.sub(' ', name).strip()
+    return name[:1].upper() + name[1:]
+
+
+def blank_param_value(value):
+    """
+    Return the whitespace that remains when a parameter value is blanked.
+
+    This matches mwparserfromhell's Template.remove with keep_field.
+
+    @param value: parameter value
+    @type value: str
+    @rtype: str
+    """
+    if value.isspace():
+        return value
+    return (value[:len(value) - len(value.lstrip())] +
+            value[len(value.rstrip()):])
 
 
 def validate_config(config):
@@ -162,16 +198,19 @@ class InfoboxCoordinatesParametersMigrator(
         self.coordinatesSets = self.getOption('coordinatesSets')
         self.template = self.getOption('template')
         self.keepParameters = self.getOption('keepParameters')
-        self.templateTitles = [self.template.title(withNamespace=False),
-                               self.template.title(underscore=True,
-                                                   withNamespace=False)]
+        templateTitles = [self.template.title(withNamespace=False)]
         for tpl in self.template.backlinks(
             filterRedirects=True,
             namespaces=self.site.namespaces.TEMPLATE
         ):
-            self.templateTitles.append(tpl.title(withNamespace=False))
-            self.templateTitles.append(
-                tpl.title(underscore=True, withNamespace=False))
+            templateTitles.append(tpl.title(withNamespace=False))
+        self.templateTitles = frozenset(
+            normalize_template_name(title) for title in templateTitles)
+        self.spacingPatterns = {}
+        for coordinatesSet in self.coordinatesSets:
+            for name in coordinatesSet.get('replacementParameterNames'):
+                self.spacingPatterns[name] = re.compile(
+                    r'\n?[ \t]*(\|\s*%s)\s*=\s*' % re.escape(name))
         summary = self.getOption('editSummary')
         if summary is None:
             self.summary = (
@@ -198,45 +237,100 @@ class InfoboxCoordinatesParametersMigrator(
                 sys.exit('%s disabled:\n%s' %
                          (self.__class__.__name__, content))
 
-    def get_replacement_parameter_spaces(self, templateText, parameterName):
+    def get_spacing_profile(self, tpl):
         """
         Determine template spacing and return a tuple of spaces before the pipe
-        and spaces before the =
+        and the full parameter length (None if there are no spaces before the
+        =)
+
+        The parameter values are blanked from the already parsed nodes so
+        that the regex doesn't match in them, without parsing the template
+        again.
+
+        @param tpl: template to analyze
+        @type tpl: mwparserfromhell.nodes.Template
+        @rtype: tuple
+        """
+        skeleton = ['{{', str(tpl.name)]
+        for param in tpl.params:
+            skeleton.append('|')
+            if param.showkey:
+                skeleton.append('%s=' % param.name)
+            skeleton.append(blank_param_value(str(param.value)))
+        skeleton.append('}}')
+        matches = PARAMSPACING.findall(''.join(skeleton))
+        if not matches:
+            return ('', None)
+        beforePipeSpacesLen = [len(match[0]) for match in matches]
+        try:
+            beforePipe = statistics.mode(beforePipeSpacesLen) * ' '
+        except statistics.StatisticsError:
+            beforePipe = statistics.median_low(beforePipeSpacesLen) * ' '
+        hasSpacesBeforeEquals = [(len(match[2]) > 1) for match in matches]
+        if not max(hasSpacesBeforeEquals):
+            return (beforePipe, None)
+        fullParamLens = [(len(match[1]) + len(match[2])) for match in matches]
+        try:
+            fullParamLen = statistics.mode(fullParamLens)
+        except statistics.StatisticsError:
+            fullParamLen = statistics.median_high(fullParamLens)
+        return (beforePipe, fullParamLen)
+
+    def get_replacement_parameter_spaces(self, profile, parameterName):
+        """
+        Return a tuple of spaces before the pipe and spaces before the =
 
-        @param templateText: template text to parse
-        @type templateText: str
+        @param profile: spacing profile from get_spacing_profile
+        @type profile: tuple
         @param parameterName: parameter name
         @type parameterName: str
         @rtype: tuple
         """
-        wikicode = mwparserfromhell.parse(
-            templateText.strip(),
-            skip_style_tags=True
-        )
-        tpl = wikicode.filter_templates(recursive=False)[0]
-        # Remove parameter values so that the regex doesn't match in them.
-        for param in tpl.params:
-            tpl.remove(param, keep_field=True)
-        matches = re.findall(r'\n( *)\|\s*(\S+)(\s*)=', str(wikicode))
-        if matches:
-            beforePipeSpacesLen = [len(match[0]) for match in matches]
-            try:
-                beforePipe = statistics.mode(beforePipeSpacesLen) * ' '
-            except statistics.StatisticsError:
-                beforePipe = statistics.median_low(beforePipeSpacesLen) * ' '
-            hasSpacesBeforeEquals = [(len(match[2]) > 1) for match in matches]
-            if max(hasSpacesBeforeEquals):
-                fullParamLens = [(len(match[1]) + len(match[2]))
-                                 for match in matches]
-                try:
-                    fullParamLen = statistics.mode(fullParamLens)
-                except statistics.StatisticsError:
-                    fullParamLen = statistics.median_high(fullParamLens)
-                beforeEquals = max(fullParamLen - len(parameterName), 1) * ' '
-            else:
-                beforeEquals = ' '
-            return (beforePipe, beforeEquals)
-        return ('', ' ')
+        beforePipe, fullParamLen = profile
+        if fullParamLen is None:
+            return (beforePipe, ' ')
+        return (beforePipe, max(fullParamLen - len(parameterName), 1) * ' ')
+
+    def fix_parameter_spacing(self, text, parameterName, parameterValue,
+                              spaces):
+        """
+        Fix the spacing of the replacement parameter and return the text
+
+        @param text: page text
+        @type text: str
+        @param parameterName: replacement parameter name
+        @type parameterName: str
+        @param parameterValue: replacement parameter value
+        @type parameterValue: str
+        @param spaces: spaces before the pipe and spaces before the =
+        @type spaces: tuple
+        @rtype: str
+        """
+        beforePipe, beforeEquals = spaces
+        parts = []
+        last = 0
+        for match in self.spacingPatterns[parameterName].finditer(text):
+            if match.start() < last:
+                continue
+            if not text.startswith(parameterValue, match.end()):
+                continue
+            end = SPACINGEND.match(text, match.end() + len(parameterValue))
+            if not end:
+                continue
+            parts.append(text[last:match.start()])
+            parts.append('\n%s%s%s= %s\n%s%s' % (
+                beforePipe,
+                match.group(1),
+                beforeEquals,
+                parameterValue,
+                beforePipe,
+                end.group(1)
+            ))
+            last = end.end()
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return ''.join(parts)
 
     def treat_page(self):
         self.check_enabled()
@@ -248,11 +342,13 @@ class InfoboxCoordinatesParametersMigrator(
 
         # Loop over all templates on the page.
         for tpl in wikicode.filter_templates():
-            if not tpl.name.matches(self.templateTitles):
+            if (normalize_template_name(str(tpl.name))
+                    not in self.templateTitles):
                 continue
 
             keepParameters = list(self.keepParameters)
             removeParameters = []
+            spacingProfile = None
 
             # Loop over each set of coordinates.
             for coordinatesSet in self.coordinatesSets:
@@ -328,11 +424,13 @@ class InfoboxCoordinatesParametersMigrator(
                                 'parametersDefaults').items()):
                             if not replacementParameterValue.has(key):
                                 replacementParameterValue.add(key, value)
+                    if spacingProfile is None:
+                        spacingProfile = self.get_spacing_profile(tpl)
                     spacingFixNeeded.append((
                         replacementParameterName,
                         str(replacementParameterValue),
                         self.get_replacement_parameter_spaces(
-                            str(tpl),
+                            spacingProfile,
                             replacementParameterName
                         )
                     ))
@@ -350,14 +448,7 @@ class InfoboxCoordinatesParametersMigrator(
         if not skipPage and newtext != text:
             # Fix spacing for the replacement parameters.
             for tup in spacingFixNeeded:
-                newtext = re.sub(
-                    r'\n?[ \t]*(\|\s*%s)\s*=\s*(%s)\s*(\||\}\})' % (
-                        re.escape(tup[0]),
-                        re.escape(tup[1])
-                    ),
-                    r'\n%s\1%s= \2\n%s\3' % (tup[2][0], tup[2][1], tup[2][0]),
-                    newtext
-                )
+                newtext = self.fix_parameter_spacing(newtext, *tup)
             self.put_current(newtext, summary=self.summary, minor=False)
 
 
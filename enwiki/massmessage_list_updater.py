@@ -19,6 +19,11 @@ The following parameters are supported:
 
 -rename           Rename logs will be parsed. If -meta from metawiki.
 
+-shutoff_edits:n  Edits between shutoff page checks. Default: 10
+
+-shutoff_interval:n
+                  Seconds between shutoff page checks. Default: 60
+
 -start_date       Logs will be parsed ending on this date. The default is
                   yesterday. Format: YYYY-MM-DD.
 """
@@ -27,10 +32,12 @@ The following parameters are supported:
 import datetime
 import json
 import re
+from bisect import bisect_left, insort
 from collections import OrderedDict
 from datetime import date, time, timedelta
 from itertools import chain
 from operator import itemgetter
+from time import monotonic
 
 import pywikibot
 from pywikibot.bot import ExistingPageBot, NoRedirectPageBot, SingleSiteBot
@@ -139,11 +146,218 @@ def validate_options(options):
         elif key in 'end_date' 'start_date':
             if not isinstance(value, datetime.date):
                 return False
+        elif key in ('shutoff_edits', 'shutoff_interval'):
+            try:
+                options[key] = int(value)
+            except ValueError:
+                options[key] = 0
+            if options[key] < 1:
+                pywikibot.error('-{} must be a positive integer.'.format(key))
+                return False
     if sorted(has_keys) != sorted(required_keys):
         return False
     return True
 
 
+def index_group_changes(group_changes):
+    """
+    Collapse group changes into a net delta per user indexed by group.
+
+    The changes are applied in timestamp order, so a group added and later
+    removed (or vice versa) only counts as its final state.
+
+    @param group_changes: group changes sorted by timestamp
+    @type group_changes: iterable of dict
+
+    @return: net delta per user and the users changed per group
+    @rtype: tuple
+    """
+    deltas = dict()
+    for change in group_changes:
+        delta = deltas.setdefault(
+            change['user'], {'added': set(), 'removed': set()}
+        )
+        delta['added'] -= change['removed']
+        delta['removed'] -= change['added']
+        delta['added'] |= change['added']
+        delta['removed'] |= change['removed']
+    groups = dict()
+    for user, delta in deltas.items():
+        for group in delta['added'] | delta['removed']:
+            groups.setdefault(group, set()).add(user)
+    return deltas, groups
+
+
+class TargetList:
+    """
+    Sorted MassMessage list targets kept as normalised title strings.
+
+    Targets are ordered the same way as sorting L{pywikibot.Page} objects
+    (namespace, then title), but each title is only normalised once and
+    each target is only serialised once.
+    """
+
+    def __init__(self, pages=()):
+        """
+        Initializer.
+
+        @param pages: initial targets
+        @type pages: iterable of L{pywikibot.Page}
+        """
+        self._keys = dict()
+        self._json = dict()  # For _target_json().
+        for page in pages:
+            key = (page.namespace().id, page.title())
+            self._keys[key[1]] = key
+        self._sorted_keys = sorted(self._keys.values())
+
+    def __contains__(self, title):
+        """Return True if the title is a target."""
+        return title in self._keys
+
+    def __iter__(self):
+        """Iterate over the titles in sorted order."""
+        return (key[1] for key in self._sorted_keys)
+
+    def __len__(self):
+        """Return the number of targets."""
+        return len(self._sorted_keys)
+
+    def add(self, page):
+        """
+        Add a target and return its title.
+
+        @param page: target to add
+        @type page: L{pywikibot.Page}
+
+        @rtype: str
+        """
+        key = (page.namespace().id, page.title())
+        if key[1] not in self._keys:
+            self._keys[key[1]] = key
+            insort(self._sorted_keys, key)
+        return key[1]
+
+    def remove(self, title):
+        """
+        Remove a target and return True if it was a target.
+
+        @param title: title of the target to remove
+        @type title: str
+
+        @rtype: bool
+        """
+        key = self._keys.pop(title, None)
+        if key is None:
+            return False
+        self._json.pop(title, None)
+        del self._sorted_keys[bisect_left(self._sorted_keys, key)]
+        return True
+
+    def rename(self, title, page):
+        """
+        Replace a target with another and return the new title.
+
+        @param title: title of the target to replace
+        @type title: str
+        @param page: replacement target
+        @type page: L{pywikibot.Page}
+
+        @rtype: str
+        """
+        self.remove(title)
+        return self.add(page)
+
+    def _target_json(self, title):
+        """Return the serialised target for the title."""
+        if title not in self._json:
+            self._json[title] = (
+                '        {{\n            "title": {}\n        }}'.format(
+                    json.dumps(title, ensure_ascii=False)
+                )
+            )
+        return self._json[title]
+
+    def to_json(self, description):
+        """
+        Return the MassMessage list content.
+
+        The output is identical to json.dumps() with ensure_ascii=False and
+        indent=4, but only the targets are serialised individually.
+
+        @param description: list description
+        @type description: str
+
+        @rtype: str
+        """
+        if self._sorted_keys:
+            targets = '[\n{}\n    ]'.format(
+                ',\n'.join(self._target_json(title) for title in self)
+            )
+        else:
+            targets = '[]'
+        return '{{\n    "description": {},\n    "targets": {}\n}}'.format(
+            json.dumps(description, ensure_ascii=False, indent=4).replace(
+                '\n', '\n    '
+            ),
+            targets,
+        )
+
+
+class ShutoffMonitor:
+    """
+    Monitor for a shutoff page.
+
+    Checking the revision ID on every edit is wasteful for large lists, so
+    it is checked once every interval seconds or every edits checks. The
+    content is only fetched when the revision changes.
+    """
+
+    def __init__(self, page, interval, edits):
+        """
+        Initializer.
+
+        @param page: shutoff page
+        @type page: L{pywikibot.Page}
+        @param interval: seconds between revision checks
+        @type interval: int
+        @param edits: checks between revision checks
+        @type edits: int
+        """
+        self.page = page
+        self.interval = interval
+        self.edits = edits
+        self.content = ''
+        self._checked = None
+        self._count = 0
+        self._revid = None
+
+    def check(self):
+        """
+        Return True if the shutoff page has content.
+
+        @rtype: bool
+        """
+        if self.content:
+            return True
+        self._count += 1
+        if (
+            self._checked is not None
+            and self._count < self.edits
+            and monotonic() - self._checked < self.interval
+        ):
+            return False
+        self._checked = monotonic()
+        self._count = 0
+        self.page.site.loadpageinfo(self.page)
+        revid = self.page.latest_revision_id if self.page.exists() else 0
+        if revid != self._revid:
+            self._revid = revid
+            if revid:
+                self.content = self.page.get(force=True).strip()
+        return bool(self.content)
+
+
 class UserGroupsMassMessageListUpdater(
     SingleSiteBot, NoRedirectPageBot, ExistingPageBot
 ):
@@ -164,10 +378,16 @@ class UserGroupsMassMessageListUpdater(
                 'renames': [
                     {'olduser': None, 'newuser': None, 'timestamp': None}
                 ],
+                'shutoff_edits': 10,
+                'shutoff_interval': 60,
             }
         )
         self.generator = generator
         super().__init__(**kwargs)
+        self.shutoff_monitor = None
+        self.group_deltas, self.group_index = index_group_changes(
+            self.getOption('group_changes')
+        )
 
     def check_disabled(self):
         """Check if the task is disabled. If so, quit."""
@@ -179,12 +399,19 @@ class UserGroupsMassMessageListUpdater(
                 username=self.site.user(), class_name=self.__class__.__name__
             ),
         )
-        if page.exists():
-            content = page.get(force=True).strip()
-            if content:
-                e = '{} disabled:\n{}'.format(self.__class__.__name__, content)
-                pywikibot.error(e)
-                self.quit()
+        if self.shutoff_monitor is None:
+            self.shutoff_monitor = ShutoffMonitor(
+                page,
+                interval=self.getOption('shutoff_interval'),
+                edits=self.getOption('shutoff_edits'),
+            )
+        monitor = self.shutoff_monitor
+        if monitor.check():
+            e = '{} disabled:\n{}'.format(
+                self.__class__.__name__, monitor.content
+            )
+            pywikibot.error(e)
+            self.quit()
 
     def treat_page(self):
         """Process one page."""
@@ -195,16 +422,20 @@ class UserGroupsMassMessageListUpdater(
         page_json = json.loads(
             self.current_page.text, object_pairs_hook=OrderedDict
         )
-        page_dict = {'>nonusers': set()}
+        pages = [
+            pywikibot.Page(self.site, item['title'])
+            for item in page_json['targets']
+        ]
+        targets = TargetList(pages)
+        users = dict()
 
         # Process the current targets.
-        for item in page_json['targets']:
-            page = pywikibot.Page(self.site, item['title'])
+        for page in pages:
             if page.namespace().id not in (2, 3):
-                page_dict['>nonusers'].add(page)
                 continue
+            title = page.title()
             base_page = pywikibot.Page(
-                self.site, re.sub(r'^([^/]+).*', r'\1', page.title())
+                self.site, re.sub(r'^([^/]+).*', r'\1', title)
             )
             if base_page.isTalkPage():
                 user = pywikibot.User(base_page.toggleTalkPage())
@@ -220,19 +451,17 @@ class UserGroupsMassMessageListUpdater(
                     re.sub(
                         r':{}\b'.format(re.escape(user.title(with_ns=False))),
                         ':{}'.format(newuser.title(with_ns=False)),
-                        page.title(),
+                        title,
                     ),
                 )
+                newtitle = targets.rename(title, newpage)
                 pywikibot.log(
                     '{} renamed to {} ({} to {})'.format(
-                        user.title(),
-                        newuser.title(),
-                        page.title(),
-                        newpage.title(),
+                        user.title(), newuser.title(), title, newtitle
                     )
                 )
                 user = newuser
-                page = newpage
+                title = newtitle
                 renamed_count += 1
             if page_config.get('required', None):
                 if not page_config['group'] & set(user.groups()):
@@ -241,39 +470,40 @@ class UserGroupsMassMessageListUpdater(
                             user.title()
                         )
                     )
+                    targets.remove(title)
                     removed_count += 1
                     continue
-            page_dict[user] = page
+            # Only keep the last target for each user.
+            if users.get(user, title) != title:
+                targets.remove(users[user])
+            users[user] = title
 
         # Handle group changes.
-        for change in self.getOption('group_changes'):
-            user = change['user']
+        changed_users = set()
+        for group in page_config['group']:
+            changed_users |= self.group_index.get(group, set())
+        for user in sorted(changed_users):
+            delta = self.group_deltas[user]
             if (
                 page_config.get('add', None)
-                and (page_config['group'] & change['added'])
+                and (page_config['group'] & delta['added'])
                 and 'bot' not in user.groups()
-                and user not in page_dict
+                and user not in users
             ):
                 pywikibot.log('Added {}'.format(user.title()))
-                page_dict[user] = user.toggleTalkPage()
+                users[user] = targets.add(user.toggleTalkPage())
                 added_count += 1
             if page_config.get('remove', None) and (
-                page_config['group'] & change['removed']
+                page_config['group'] & delta['removed']
             ):
-                if page_dict.pop(user, None):
+                if user in users:
+                    targets.remove(users.pop(user))
                     pywikibot.log('Removed {}'.format(user.title()))
                     removed_count += 1
 
         # Build JSON and save.
         if added_count + removed_count + renamed_count > 0:
-            new_pge_json = OrderedDict()
-            new_pge_json['description'] = page_json['description']
-            new_pge_json['targets'] = list()
-            for page in sorted(
-                page_dict.pop('>nonusers') | set(page_dict.values())
-            ):
-                new_pge_json['targets'].append({'title': page.title()})
-            text = json.dumps(new_pge_json, ensure_ascii=False, indent=4)
+            text = targets.to_json(page_json['description'])
             summary = 'Update MassMessage list: {} added, {} removed'.format(
                 added_count, removed_count
             )
@@ -307,6 +537,8 @@ def main(*args):
                     'Please enter a value for {}'.format(arg), default=None
                 )
             options[arg] = value
+        elif arg in ('shutoff_edits', 'shutoff_interval'):
+            options[arg] = value
         else:
             options[arg] = True
     if not validate_options(options):
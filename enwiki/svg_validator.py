@@ -7,9 +7,38 @@ The following arguments are supported:
 
 -always           Don't prompt to save changes.
 
+-post             Download each file and POST it to the validator instead
+                  of having the validator fetch it.
+
+-shutoff_edits:n  Edits between shutoff page checks. Default: 10
+
+-shutoff_interval:n
+                  Seconds between shutoff page checks. Default: 60
+
+-validator:url    Nu validator endpoint. Default: https://validator.w3.org/nu/
+                  Use with -post for a self-hosted validator.
+
+-workers:n        Number of files to validate concurrently. Default: 4
+
 &params;
 """
-from typing import Any, Dict, FrozenSet, Iterable, List
+import json
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from time import monotonic, time
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 
 import mwparserfromhell
 import pywikibot
@@ -17,9 +46,17 @@ import requests
 from mwparserfromhell.nodes import Template
 from pywikibot.bot import ExistingPageBot, SingleSiteBot
 from pywikibot.comms.http import user_agent
+from pywikibot.data.api import PropertyGenerator, update_page
 from pywikibot.pagegenerators import GeneratorFactory, parameterHelp
 from pywikibot.textlib import removeDisabledParts
-from requests.exceptions import Timeout, RequestException
+from pywikibot.tools import itergroup
+from requests.adapters import HTTPAdapter
+from requests.exceptions import (
+    ConnectionError as RequestsConnectionError,
+    HTTPError,
+    RequestException,
+    Timeout,
+)
 
 
 docuReplacements = {'&params;': parameterHelp}  # pylint: disable=invalid-name
@@ -53,28 +90,360 @@ def get_redirects(
     return _redirects_cache[pages]
 
 
+def file_info_preloading_generator(
+    generator: Iterable[pywikibot.Page], groupsize: int = 50
+) -> Generator[pywikibot.Page, None, None]:
+    """
+    Yield pages with the latest file info of files preloaded in batches.
+
+    Files are yielded as L{pywikibot.FilePage} with their URL, SHA-1, size
+    and MIME type loaded, so the bot needs no imageinfo request per file.
+
+    @param generator: pages to preload
+    @param groupsize: number of pages to query at once
+    """
+    for batch in itergroup(generator, groupsize):
+        files = dict()
+        for page in batch:
+            try:
+                files[page.title()] = pywikibot.FilePage(page)
+            except ValueError:
+                pass
+        if files:
+            gen = PropertyGenerator(
+                'imageinfo',
+                site=batch[0].site,
+                parameters={
+                    'titles': list(files),
+                    'iiprop': 'timestamp|user|comment|url|size|sha1|mime',
+                },
+            )
+            for data in gen:
+                if data['title'] in files and 'imageinfo' in data:
+                    update_page(files[data['title']], data, {'imageinfo'})
+        for page in batch:
+            yield files.get(page.title(), page)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Return the seconds to wait from a Retry-After header value.
+
+    @param value: header value, either seconds or an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class NuValidatorClient:
+    """
+    Client for the Nu validator shared by all files and workers.
+
+    Failed requests are retried with jittered exponential backoff, or after
+    the Retry-After delay of HTTP 429 and 503 responses. The read timeout
+    follows the observed latency. Other server errors (HTTP 5xx) count as
+    failures but are not retried.
+
+    After failure_threshold consecutive failures the circuit opens and
+    requests fail right away, so files are skipped instead of each waiting
+    out its own retries. Once the cooldown has passed, a single request is
+    let through as a probe: if it succeeds the circuit closes, otherwise it
+    reopens with the cooldown doubled.
+    """
+
+    LATENCY_FACTOR = 4
+    MIN_TIMEOUT = 5.0
+    RETRY_STATUSES = (429, 502, 503, 504)
+
+    def __init__(
+        self,
+        session: requests.Session,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+    ) -> None:
+        """
+        Initializer.
+
+        @param session: session to send the requests with
+        @param failure_threshold: consecutive failures to open the circuit
+        @param cooldown: initial seconds to keep the circuit open
+        """
+        self.session = session
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._latency = None  # type: Optional[float]
+        self._is_open = False
+        self._open_for = cooldown
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """Return the connect and read timeouts for the next request."""
+        timeout = pywikibot.config.socket_timeout
+        if isinstance(timeout, (tuple, list)):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+        if self._latency is not None:
+            read = min(
+                max(self._latency * self.LATENCY_FACTOR, self.MIN_TIMEOUT),
+                read,
+            )
+        return connect, read
+
+    def _observe(self, latency: float) -> None:
+        """Update the latency estimate."""
+        with self._lock:
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency = 0.8 * self._latency + 0.2 * latency
+
+    def _acquire(self) -> bool:
+        """
+        Check the circuit before a request and return True for a probe.
+
+        @raises RequestException: the circuit is open
+        """
+        with self._lock:
+            if not self._is_open:
+                return False
+            if self._probing or monotonic() < self._open_until:
+                raise RequestException('Nu validator circuit is open.')
+            self._probing = True
+            return True
+
+    def _release(self, probe: bool) -> None:
+        """Let another request probe the circuit."""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def _success(self, latency: float) -> None:
+        """Record a successful request and close the circuit."""
+        self._observe(latency)
+        with self._lock:
+            if self._is_open:
+                pywikibot.output('Nu validator circuit closed.')
+            self._failures = 0
+            self._is_open = False
+            self._open_for = self.cooldown
+            self._probing = False
+
+    def _failure(
+        self, retry_after: Optional[float] = None, probe: bool = False
+    ) -> None:
+        """Record a failed request and open the circuit if needed."""
+        with self._lock:
+            self._failures += 1
+            if probe:
+                self._probing = False
+            elif self._is_open or self._failures < self.failure_threshold:
+                return
+            open_for = max(self._open_for, retry_after or 0)
+            pywikibot.warning(
+                'Nu validator circuit open for {:.0f} s.'.format(open_for)
+            )
+            self._is_open = True
+            self._open_until = monotonic() + open_for
+            self._open_for = min(
+                self._open_for * 2, pywikibot.config.retry_max
+            )
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        """
+        Send a request to the validator and return the response.
+
+        @param method: HTTP method
+        @param url: validator URL
+        @param kwargs: passed to L{requests.Session.request}
+        @raises RequestException: the request failed after all retries or
+            the circuit is open
+        """
+        retries = 0
+        while True:
+            probe = self._acquire()
+            timeout = self.timeout
+            start = monotonic()
+            try:
+                response = self.session.request(
+                    method, url, timeout=timeout, **kwargs
+                )
+            except Timeout as e:
+                # Allow for slower responses on the next attempt.
+                self._observe(timeout[1])
+                error = e  # type: RequestException
+                retry_after = None
+            except RequestsConnectionError as e:
+                error = e
+                retry_after = None
+            except RequestException:
+                self._release(probe)
+                raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    if response.status_code < 500:
+                        self._success(monotonic() - start)
+                    else:
+                        self._failure(probe=probe)
+                    return response
+                error = HTTPError(
+                    'HTTP {} from the Nu validator'.format(
+                        response.status_code
+                    ),
+                    response=response,
+                )
+                retry_after = parse_retry_after(
+                    response.headers.get('Retry-After')
+                )
+            self._failure(retry_after, probe=probe)
+            if self._is_open or retries >= pywikibot.config.max_retries:
+                raise error
+            retries += 1
+            if retry_after is None:
+                retry_after = random.uniform(
+                    0,
+                    min(
+                        pywikibot.config.retry_wait * 2 ** retries,
+                        pywikibot.config.retry_max,
+                    ),
+                )
+            pywikibot.warning(
+                '{}; retrying in {:.1f} s.'.format(error, retry_after)
+            )
+            pywikibot.sleep(retry_after)
+
+
+class ShutoffMonitor:
+    """
+    Monitor for a shutoff page.
+
+    The revision ID is checked once every interval seconds or every edits
+    checks, whichever comes first, rather than with a request per file.
+    The content is only fetched when the revision changes.
+    """
+
+    def __init__(
+        self,
+        page: pywikibot.Page,
+        interval: int,
+        edits: int,
+    ) -> None:
+        """
+        Initializer.
+
+        @param page: shutoff page
+        @param interval: seconds between revision checks
+        @param edits: checks between revision checks
+        """
+        self.page = page
+        self.interval = interval
+        self.edits = edits
+        self.content = ''
+        self._checked = None  # type: Optional[float]
+        self._count = 0
+        self._revid = None  # type: Optional[int]
+
+    def check(self) -> bool:
+        """Return True if the shutoff page has content."""
+        if self.content:
+            return True
+        self._count += 1
+        if (
+            self._checked is not None
+            and self._count < self.edits
+            and monotonic() - self._checked < self.interval
+        ):
+            return False
+        self._checked = monotonic()
+        self._count = 0
+        self.page.site.loadpageinfo(self.page)
+        revid = self.page.latest_revision_id if self.page.exists() else 0
+        if revid != self._revid:
+            self._revid = revid
+            if revid:
+                self.content = self.page.get(force=True).strip()
+        return bool(self.content)
+
+
 class SVGValidatorBot(SingleSiteBot, ExistingPageBot):
     """Bot to validate SVGs."""
 
     def __init__(self, **kwargs: Any) -> None:
         """Initializer."""
+        self.available_options.update(  # pylint: disable=no-member
+            {
+                'post': False,
+                'shutoff_edits': 10,
+                'shutoff_interval': 60,
+                'validator': 'https://validator.w3.org/nu/',
+                'workers': 4,
+            }
+        )
         super().__init__(**kwargs)
+        self.shutoff_monitor = None  # type: Optional[ShutoffMonitor]
+        # Pending validations in generator order. A page may be yielded
+        # more than once (e.g., overlapping categories).
+        self.validations = (
+            dict()
+        )  # type: Dict[pywikibot.Page, deque]
+        self.generator = self.validation_generator(self.generator)
         self.nu_session = requests.Session()
-        self.nu_session.headers['user-agent'] = user_agent(
-            kwargs['site'],
-            '{script_product} ({script_comments}) {http_backend} {python}',
-        )
+        # Files are downloaded without the validator parameters, which
+        # would bypass the CDN cache.
+        self.file_session = requests.Session()
+        for session in (self.nu_session, self.file_session):
+            for prefix in ('http://', 'https://'):
+                session.mount(
+                    prefix, HTTPAdapter(pool_maxsize=self.opt.workers)
+                )
+            session.headers['user-agent'] = user_agent(
+                kwargs['site'],
+                '{script_product} ({script_comments}) {http_backend} '
+                '{python}',
+            )
         self.nu_session.params = {'level': 'error', 'out': 'json'}
-        self.templates = get_redirects(
-            {
-                pywikibot.Page(self.site, 'Invalid SVG', ns=10),
-                pywikibot.Page(self.site, 'Valid SVG', ns=10),
-            }
+        self.nu_client = NuValidatorClient(self.nu_session)
+        self.invalid_templates = get_redirects(
+            {pywikibot.Page(self.site, 'Invalid SVG', ns=10)}
         )
+        self.valid_templates = get_redirects(
+            {pywikibot.Page(self.site, 'Valid SVG', ns=10)}
+        )
+        self.templates = self.invalid_templates | self.valid_templates
+        # Validation results keyed by SHA-1.
+        self.results_file = pywikibot.config.datafilepath(
+            'svg_validator-results.json'
+        )
+        try:
+            with open(self.results_file, encoding='utf-8') as f:
+                self.results = json.load(f)  # type: Dict[str, Dict]
+        except (OSError, ValueError) as e:
+            pywikibot.log('Validation results not loaded: {}'.format(e))
+            self.results = dict()
 
     def teardown(self) -> None:
-        """Close the W3C nu validator session."""
+        """Close the sessions and save the results."""
         self.nu_session.close()
+        self.file_session.close()
+        try:
+            with open(self.results_file, 'w', encoding='utf-8') as f:
+                json.dump(self.results, f, ensure_ascii=False)
+        except OSError as e:
+            pywikibot.log('Validation results not saved: {}'.format(e))
 
     def init_page(self, item: Any) -> pywikibot.Page:
         """Re-class the page."""
@@ -84,13 +453,58 @@ class SVGValidatorBot(SingleSiteBot, ExistingPageBot):
         except ValueError:
             return page
 
+    @staticmethod
+    def is_svg(page: pywikibot.Page) -> bool:
+        """Return True if the page is an SVG file based on its MIME type."""
+        if not isinstance(page, pywikibot.FilePage):
+            return False
+        try:
+            return page.latest_file_info.mime == 'image/svg+xml'
+        except pywikibot.Error:
+            return False
+
     def skip_page(self, page: pywikibot.Page) -> bool:
-        """Sikp the page if it is not an SVG."""
-        if not isinstance(page, pywikibot.FilePage) or not page.title(
-            with_ns=False
-        ).lower().endswith('.svg'):
+        """Sikp the page if it is not an SVG or is not being validated."""
+        if not self.is_svg(page) or super().skip_page(page):
+            self.pop_validation(page)
             return True
-        return super().skip_page(page)
+        return page not in self.validations
+
+    def pop_validation(self, page: pywikibot.Page) -> Optional[Future]:
+        """Remove and return the next pending validation for the page."""
+        futures = self.validations.get(page)
+        if not futures:
+            return None
+        future = futures.popleft()
+        if not futures:
+            del self.validations[page]
+        return future
+
+    def validation_generator(
+        self, generator: Iterable[Any]
+    ) -> Generator[Any, None, None]:
+        """
+        Yield items from the generator while validating ahead.
+
+        SVGs are validated on a thread pool, up to the number of workers
+        ahead of the page being treated. Items are yielded in order.
+
+        @param generator: the page generator that determines on which
+            pages to work
+        """
+        workers = self.opt.workers
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            queue = deque()  # type: deque
+            for item in generator:
+                page = self.init_page(item)
+                if self.is_svg(page):
+                    self.validations.setdefault(page, deque()).append(
+                        executor.submit(self.validate_svg, page)
+                    )
+                queue.append(item)
+                if len(queue) > workers:
+                    yield queue.popleft()
+            yield from queue
 
     def check_disabled(self) -> None:
         """Check if the task is disabled. If so, quit."""
@@ -102,47 +516,65 @@ class SVGValidatorBot(SingleSiteBot, ExistingPageBot):
                 username=self.site.user(), class_name=self.__class__.__name__
             ),
         )
-        if page.exists():
-            content = page.get(force=True).strip()
-            if content:
-                e = '{} disabled:\n{}'.format(self.__class__.__name__, content)
-                pywikibot.error(e)
-                self.quit()
-
-    def validate_svg(self) -> List[str]:
+        if self.shutoff_monitor is None:
+            self.shutoff_monitor = ShutoffMonitor(
+                page,
+                interval=self.opt.shutoff_interval,
+                edits=self.opt.shutoff_edits,
+            )
+        monitor = self.shutoff_monitor
+        if monitor.check():
+            e = '{} disabled:\n{}'.format(
+                self.__class__.__name__, monitor.content
+            )
+            pywikibot.error(e)
+            self.quit()
+
+    def download_file(self, url: str) -> bytes:
+        """
+        Download a file with the shared file session.
+
+        @param url: file URL
+        """
+        with self.file_session.get(
+            url, stream=True, timeout=pywikibot.config.socket_timeout
+        ) as response:
+            response.raise_for_status()
+            return b''.join(response.iter_content(chunk_size=65536))
+
+    def validate_svg(self, page: pywikibot.FilePage) -> List[str]:
         """
         Validate a SVG using the W3C Nu validator.
 
-        Returns a list of validation error messages.
+        Returns a list of validation error messages. Results are cached by
+        the file's SHA-1, so unchanged files are only validated once. Files
+        without a SHA-1 (e.g., hidden) are not cached.
+
+        @param page: file to validate
 
         @raises RuntimeError: validation is indeterminate
         @raises AssertionError: 1) response root does not have the messages key
             with a list or 2) request URL does not match the response URL
         """
-        url = self.current_page.get_file_url()
+        sha1 = getattr(page.latest_file_info, 'sha1', None)
+        if sha1 and sha1 in self.results:
+            return self.results[sha1]['errors']
+        url = page.get_file_url()
         _logger = 'w3c-nu'
-        retries = 0
-        retry_wait = pywikibot.config.retry_wait
         # API docs: https://github.com/validator/validator/wiki
-        while True:
-            try:
-                response = self.nu_session.get(
-                    url='https://validator.w3.org/nu/',
-                    params={'doc': url},
-                    timeout=pywikibot.config.socket_timeout,
-                )
-            except Timeout:
-                if (
-                    retry_wait > pywikibot.config.retry_max
-                    or retries == pywikibot.config.max_retries
-                ):
-                    raise
-                pywikibot.exception()
-                pywikibot.sleep(retry_wait)
-                retries += 1
-                retry_wait += pywikibot.config.retry_wait
-            else:
-                break
+        if self.opt.post:
+            response = self.nu_client.request(
+                'POST',
+                self.opt.validator,
+                data=self.download_file(url),
+                # No charset: it would override the XML encoding
+                # declaration (RFC 7303).
+                headers={'Content-Type': 'image/svg+xml'},
+            )
+        else:
+            response = self.nu_client.request(
+                'GET', self.opt.validator, params={'doc': url}
+            )
         response.raise_for_status()
         pywikibot.debug(response.text, _logger)
         data = response.json()
@@ -179,13 +611,18 @@ class SVGValidatorBot(SingleSiteBot, ExistingPageBot):
                 warnings.append(message['message'])
             else:
                 pywikibot.debug(str(message), _logger)
+        if sha1:
+            self.results[sha1] = {'errors': errors, 'warnings': warnings}
         return errors
 
     def treat_page(self) -> None:
         """Process one page."""
         self.check_disabled()
+        future = self.pop_validation(self.current_page)
+        if future is None:
+            return
         try:
-            errors = self.validate_svg()
+            errors = future.result()
         except (AssertionError, RequestException, RuntimeError):
             pywikibot.exception()
             return
@@ -213,6 +650,16 @@ class SVGValidatorBot(SingleSiteBot, ExistingPageBot):
             except pywikibot.InvalidTitle:
                 continue
             if template in self.templates:
+                if (template in self.valid_templates and not errors) or (
+                    template in self.invalid_templates
+                    and errors
+                    and tpl.has('1')
+                    and tpl.get('1').value.strip() == str(len(errors))
+                ):
+                    pywikibot.output(
+                        '{} is already tagged.'.format(self.current_page)
+                    )
+                    return
                 wikicode.replace(tpl, new_tpl)
                 break
         else:
@@ -231,10 +678,22 @@ def main(*args: str) -> None:
     for arg in local_args:
         if gen_factory.handleArg(arg):
             continue
-        arg, _, _ = arg.partition(':')
+        arg, _, value = arg.partition(':')
         arg = arg[1:]
-        options[arg] = True
+        if arg == 'validator':
+            options[arg] = value
+        elif arg in ('shutoff_edits', 'shutoff_interval', 'workers'):
+            try:
+                options[arg] = int(value)
+            except ValueError:
+                options[arg] = 0
+            if options[arg] < 1:
+                pywikibot.error('-{} must be a positive integer.'.format(arg))
+                return
+        else:
+            options[arg] = True
     gen = gen_factory.getCombinedGenerator(preload=True)
+    gen = file_info_preloading_generator(gen)
     SVGValidatorBot(generator=gen, site=site, **options).run()
 
 
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This script benchmarks the magic links replacement engine.
+
+The engine is run over the wikitext files in
+benchmark/magic_links_replacer/corpus, and the output is checked against
+the files with the same names in benchmark/magic_links_replacer/golden
+and against pywikibot's replaceExcept. Pages/sec, time per stage, and
+peak memory are reported.
+
+The following parameters are supported:
+
+-repeat:<n>       The number of times to process the corpus. Defaults to 10.
+
+-update           Write the golden files instead of checking them.
+
+-fuzz:<n>         Also compare the engine with replaceExcept on n random
+                  texts built from (possibly unbalanced) markup.
+"""
+# Author : JJMC89
+# License: MIT
+import os
+import random
+import sys
+import tracemalloc
+from time import perf_counter
+
+import pywikibot
+from pywikibot.textlib import replaceExcept
+
+from magic_links_replacer import (
+    _regexes,
+    compile_identifiers,
+    get_replace_exceptions,
+    has_identifier,
+    replace_magic_links_by_section,
+    split_into_sections,
+)
+
+
+BENCHMARK_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'benchmark',
+    'magic_links_replacer',
+)
+CONFIG = {
+    'ISBN': '{{ISBN|\\g<value>}}',
+    'PMID': '{{PMID|\\g<value>}}',
+    'RFC': '{{IETF RFC|\\g<value>}}',
+}
+FUZZ_PIECES = (
+    'ISBN 0306406152',
+    'ISBN 978-0-262-03384-8',
+    'PMID 17322060',
+    'RFC 2616',
+    'RFC&nbsp;7230',
+    '{{',
+    '}}',
+    '{{cite book|isbn=',
+    '[[',
+    ']]',
+    '[[File:X.jpg|',
+    '[http://a.b ',
+    ']',
+    'http://x.org/a',
+    '<nowiki>',
+    '</nowiki>',
+    '<pre>',
+    '</pre>',
+    '<!--',
+    '-->',
+    '<ref>',
+    '</ref>',
+    '<br />',
+    '|',
+    ' ',
+    ' ',
+    '\n',
+    '\n== Heading ==\n',
+    'x',
+    '2',
+)
+
+
+def load_corpus():
+    """
+    Return the corpus.
+
+    @rtype: list of tuple of (str, str)
+    """
+    corpus = list()
+    corpus_dir = os.path.join(BENCHMARK_DIR, 'corpus')
+    for name in sorted(os.listdir(corpus_dir)):
+        with open(os.path.join(corpus_dir, name), encoding='utf-8') as f:
+            corpus.append((name, f.read()))
+    return corpus
+
+
+def replace_text(text, engine):
+    """
+    Return the replaced text like the bot does.
+
+    @param text: text to process
+    @type text: str
+    @param engine: identifiers, replacements, and exceptions
+    @type engine: tuple
+
+    @rtype: str
+    """
+    if not has_identifier(text, engine[1]):
+        return text
+    text, _ = replace_magic_links_by_section(text, *engine)
+    return text
+
+
+def time_stages(corpus, engine):
+    """
+    Return the time in seconds for each stage of one pass over the corpus.
+
+    The sections stage is also part of the replace stage. It is timed
+    separately to show where the time goes.
+
+    @param corpus: names and texts
+    @type corpus: list of tuple of (str, str)
+    @param engine: identifiers, replacements, and exceptions
+    @type engine: tuple
+
+    @rtype: dict
+    """
+    identifiers, replacements, exceptions = engine
+    times = dict()
+    start = perf_counter()
+    texts = [text for _, text in corpus if has_identifier(text, replacements)]
+    times['prefilter'] = perf_counter() - start
+    start = perf_counter()
+    for text in texts:
+        split_into_sections(text)
+    times['sections'] = perf_counter() - start
+    start = perf_counter()
+    for text in texts:
+        replace_magic_links_by_section(
+            text, identifiers, replacements, exceptions
+        )
+    times['replace'] = perf_counter() - start
+    return times
+
+
+def replace_text_with_replace_except(text, engine):
+    """
+    Return the replaced text using replaceExcept for each identifier.
+
+    This is how the bot replaced magic links before the engine.
+
+    @param text: text to process
+    @type text: str
+    @param engine: identifiers, replacements, and exceptions
+    @type engine: tuple
+
+    @rtype: str
+    """
+    identifiers, _, exceptions = engine
+    sections = list()
+    for section in split_into_sections(text):
+        for identifier in identifiers:
+            section = replaceExcept(
+                section,
+                _regexes[identifier],
+                CONFIG[identifier],
+                exceptions,
+            )
+        sections.append(section)
+    return ''.join(sections)
+
+
+def fuzz_texts(count, seed=0):
+    """
+    Yield random texts built from markup pieces.
+
+    @param count: number of texts
+    @type count: int
+    @param seed: random seed
+    @type seed: int
+
+    @rtype: generator of str
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield ''.join(
+            rng.choice(FUZZ_PIECES) for _ in range(rng.randint(1, 30))
+        )
+
+
+def check_replace_except(texts, engine):
+    """
+    Compare the engine with replaceExcept and return the differing texts.
+
+    @param texts: texts to compare
+    @type texts: iterable of str
+    @param engine: identifiers, replacements, and exceptions
+    @type engine: tuple
+
+    @rtype: list of str
+    """
+    return [
+        text for text in texts
+        if replace_text(text, engine)
+        != replace_text_with_replace_except(text, engine)
+    ]
+
+
+def check_golden(corpus, engine, update=False):
+    """
+    Check (or write) the golden files and return the names that differ.
+
+    @param corpus: names and texts
+    @type corpus: list of tuple of (str, str)
+    @param engine: identifiers, replacements, and exceptions
+    @type engine: tuple
+    @param update: write the golden files
+    @type update: bool
+
+    @rtype: list of str
+    """
+    failures = list()
+    golden_dir = os.path.join(BENCHMARK_DIR, 'golden')
+    for name, text in corpus:
+        text = replace_text(text, engine)
+        file_name = os.path.join(golden_dir, name)
+        if update:
+            with open(file_name, 'w', encoding='utf-8') as f:
+                f.write(text)
+            continue
+        try:
+            with open(file_name, encoding='utf-8') as f:
+                expected = f.read()
+        except OSError as e:
+            pywikibot.error('{}: {}'.format(name, e))
+            failures.append(name)
+            continue
+        if text != expected:
+            failures.append(name)
+    return failures
+
+
+def main(*args):
+    """
+    Process command line arguments and run the benchmark.
+
+    @param args: command line arguments
+    @type args: list of unicode
+    """
+    options = {'fuzz': 0, 'repeat': 10, 'update': False}
+    local_args = pywikibot.handle_args(args)
+    for arg in local_args:
+        arg, _, value = arg.partition(':')
+        arg = arg[1:]
+        if arg in ('fuzz', 'repeat'):
+            try:
+                options[arg] = int(value)
+            except ValueError:
+                options[arg] = -1
+            if options[arg] < (1 if arg == 'repeat' else 0):
+                pywikibot.error('-{} must be a positive integer.'.format(arg))
+                return False
+        else:
+            options[arg] = True
+    site = pywikibot.Site()
+    engine = compile_identifiers(CONFIG) + (get_replace_exceptions(site),)
+    corpus = load_corpus()
+    failures = check_golden(corpus, engine, update=options['update'])
+    if failures:
+        pywikibot.error('Output differs: {}'.format(', '.join(failures)))
+    differences = check_replace_except(
+        [text for _, text in corpus], engine
+    ) + check_replace_except(fuzz_texts(options['fuzz']), engine)
+    for text in differences[:10]:
+        pywikibot.error('Output differs from replaceExcept: {!r}'.format(text))
+    if differences:
+        pywikibot.error(
+            '{} texts differ from replaceExcept.'.format(len(differences))
+        )
+    totals = dict()
+    for _ in range(options['repeat']):
+        for stage, seconds in time_stages(corpus, engine).items():
+            totals[stage] = totals.get(stage, 0) + seconds
+    tracemalloc.start()
+    for _, text in corpus:
+        replace_text(text, engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    pages = len(corpus) * options['repeat']
+    seconds = totals['prefilter'] + totals['replace']
+    pywikibot.output(
+        '{} pages in {:.3f} s: {:.1f} pages/sec'.format(
+            pages, seconds, pages / seconds if seconds else 0
+        )
+    )
+    for stage, stage_seconds in totals.items():
+        pywikibot.output(
+            '{:<10} {:8.2f} ms/pass'.format(
+                stage, stage_seconds * 1000 / options['repeat']
+            )
+        )
+    pywikibot.output('Peak memory: {:.1f} KiB'.format(peak / 1024))
+    return not failures and not differences
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -11,21 +11,43 @@ The following parameters are supported:
 
 -always           Don't prompt to save changes.
 
+-xmldump:<path>   Scan a local pages-articles XML dump (.xml.bz2) instead
+                  of editing. The titles of the pages that would be
+                  changed are written to stdout, e.g., for use with
+                  -file. Multistream dumps are decompressed in parallel.
+
+-workers:<n>      The number of worker processes for the text
+                  replacements. Defaults to the number of CPUs.
+
 &params;
 """
 # Author : JJMC89
 # License: MIT
+import bz2
+import io
 import json
+import os
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
 
 import pywikibot
 from pywikibot.bot import ExistingPageBot, NoRedirectPageBot, SingleSiteBot
 from pywikibot.pagegenerators import GeneratorFactory, parameterHelp
-from pywikibot.textlib import replaceExcept
+
+try:
+    from pywikibot.textlib import get_regexes
+except ImportError:  # pywikibot < 8.2
+    from pywikibot.textlib import _get_regexes as get_regexes
 
 
 docuReplacements = {'&params;': parameterHelp}  # pylint: disable=invalid-name
 _regexes = dict()  # For _create_regexes().
+_site_exceptions = dict()  # For get_replace_exceptions().
+_group_regex = re.compile(r'\\(?P<number>\d+)|\\g<(?P<name>.+?)>')
+BZ2_STREAM_MAGIC = b'BZh91AY&SY'
+XMLDUMP_CHUNK_SIZE = 4 * 1024 * 1024
 
 
 def get_json_from_page(page):
@@ -97,6 +119,9 @@ def _create_regexes():
             'bracket_url': re.compile(
                 r'(\[{}[^\]]*\])'.format(url), flags=re.I
             ),
+            'headings': re.compile(
+                r'^={1,6}.*?={1,6}(?: *<!--.*?-->)?\s*$', flags=re.M
+            ),
             'ISBN': re.compile(
                 r'\bISBN(?P<separator>{spaces})(?P<value>(?:97[89]{space_dash}'
                 r'?)?(?:[0-9]{space_dash}?){{9}}[0-9Xx])\b'.format(
@@ -134,12 +159,11 @@ def split_into_sections(text):
 
     @rtype: list
     """
-    headings_regex = re.compile(
-        r'^={1,6}.*?={1,6}(?: *<!--.*?-->)?\s*$', flags=re.M
-    )
+    if not _regexes:
+        _create_regexes()
     sections = list()
     last_match_start = 0
-    for match in headings_regex.finditer(text):
+    for match in _regexes['headings'].finditer(text):
         match_start = match.start()
         if match_start > 0:
             sections.append(text[last_match_start:match_start])
@@ -148,6 +172,402 @@ def split_into_sections(text):
     return sections
 
 
+def compile_replacement(replacement):
+    """
+    Split a replacement into literal text and group references.
+
+    The replacement is handled like L{replaceExcept}: C{\\n} becomes a
+    newline, and group references are C{\\N} and C{\\g<name>}.
+
+    @param replacement: replacement text
+    @type replacement: str
+
+    @rtype: list of (str, str or int or None)
+    """
+    replacement = replacement.replace('\\n', '\n')
+    parts = list()
+    last = 0
+    for match in _group_regex.finditer(replacement):
+        group = match.group('number') or match.group('name')
+        try:
+            group = int(group)
+        except ValueError:
+            pass
+        parts.append((replacement[last:match.start()], group))
+        last = match.end()
+    parts.append((replacement[last:], None))
+    return parts
+
+
+def has_identifier(text, identifiers):
+    """
+    Return whether the text contains any of the identifiers.
+
+    This is a cheap check before any regexes are run.
+
+    @param text: text to check
+    @type text: str
+    @param identifiers: identifiers (e.g., ISBN)
+    @type identifiers: iterable of str
+
+    @rtype: bool
+    """
+    return any(identifier in text for identifier in identifiers)
+
+
+def replace_identifier(text, regex, replacement, exceptions):
+    """
+    Replace an identifier in text, ignoring the exceptions.
+
+    This scans the text like L{replaceExcept}, so the result is the same.
+    However, the next identifier match and the span of the next match of
+    each exception regex are kept until the scan passes them instead of
+    being searched for again after every skipped exception.
+
+    After a replacement, a kept span after the replaced text is still
+    the next match once shifted, unless there is now a match at the end
+    of the replacement: only matching there looks back into the
+    replacement (e.g., C{\\b}). Exceptions with lookbehinds are always
+    searched for again.
+
+    @param text: text to process
+    @type text: str
+    @param regex: identifier regex
+    @type regex: C{re.Pattern}
+    @param replacement: compiled replacement (see L{compile_replacement})
+    @type replacement: list
+    @param exceptions: compiled exception regexes
+    @type exceptions: list of C{re.Pattern}
+
+    @return: new text and number of replacements
+    @rtype: tuple of (str, int)
+    """
+    count = 0
+    index = 0
+    match = None
+    # False means that the exception must be searched for.
+    exception_spans = [False] * len(exceptions)
+    while index <= len(text):
+        if match is None or match.start() < index:
+            match = regex.search(text, index)
+            if not match:
+                break
+        start = match.start()
+        next_exception_span = None
+        for i, exception in enumerate(exceptions):
+            span = exception_spans[i]
+            if span is False or (span and span[0] < index):
+                exception_match = exception.search(text, index)
+                span = exception_match.span() if exception_match else None
+                exception_spans[i] = span
+            if span and (
+                next_exception_span is None
+                or span[0] < next_exception_span[0]
+            ):
+                next_exception_span = span
+        if next_exception_span and next_exception_span[0] <= start:
+            index = next_exception_span[1]
+            continue
+        new = ''.join(
+            literal + (match.group(group) or '' if group is not None else '')
+            for literal, group in replacement
+        )
+        text = text[:start] + new + text[match.end():]
+        index = start + len(new)
+        delta = len(new) - (match.end() - start)
+        for i, exception in enumerate(exceptions):
+            span = exception_spans[i]
+            if span is False:
+                continue
+            if '(?<' in exception.pattern or (
+                span and span[0] <= match.end()
+            ):
+                exception_spans[i] = False
+                continue
+            exception_match = exception.match(text, index)
+            if exception_match:
+                exception_spans[i] = exception_match.span()
+            elif span:
+                exception_spans[i] = (span[0] + delta, span[1] + delta)
+        match = None
+        count += 1
+    return text, count
+
+
+def replace_magic_links(text, identifiers, replacements, exceptions):
+    """
+    Replace magic links in text, ignoring the exceptions.
+
+    The identifiers are replaced one after another like calling
+    L{replaceExcept} for each of them, since a replacement may add
+    markup that changes the exceptions for the following identifiers.
+
+    @param text: text to process
+    @type text: str
+    @param identifiers: identifiers (keys of _regexes) in order
+    @type identifiers: tuple of str
+    @param replacements: identifier to compiled replacement
+        (see L{compile_replacement})
+    @type replacements: dict
+    @param exceptions: compiled exception regexes
+    @type exceptions: list of C{re.Pattern}
+
+    @return: new text and number of replacements
+    @rtype: tuple of (str, int)
+    """
+    count = 0
+    for identifier in identifiers:
+        if identifier not in text:
+            continue
+        text, identifier_count = replace_identifier(
+            text, _regexes[identifier], replacements[identifier], exceptions
+        )
+        count += identifier_count
+    return text, count
+
+
+def replace_magic_links_by_section(
+    text, identifiers, replacements, exceptions
+):
+    """
+    Replace magic links in text section by section.
+
+    See L{replace_magic_links} for the parameters.
+
+    @return: new text and number of replacements
+    @rtype: tuple of (str, int)
+    """
+    sections = list()
+    count = 0
+    for section in split_into_sections(text):
+        section, section_count = replace_magic_links(
+            section, identifiers, replacements, exceptions
+        )
+        sections.append(section)
+        count += section_count
+    if not count:
+        return text, 0
+    return ''.join(sections), count
+
+
+def get_replace_exceptions(site):
+    """
+    Return the compiled exception regexes for the site.
+
+    The site-specific regexes (e.g., file and category aliases) are
+    resolved once per site and cached.
+
+    @param site: site used to resolve site-specific exceptions
+    @type site: L{pywikibot.site.BaseSite}
+
+    @rtype: list of C{re.Pattern}
+    """
+    if site in _site_exceptions:
+        return _site_exceptions[site]
+    if not _regexes:
+        _create_regexes()
+    exceptions = [
+        _regexes[key]
+        for key in ('bare_url', 'bracket_url', 'tags_content', 'tags')
+    ]
+    exceptions += get_regexes(
+        [
+            'category',
+            'comment',
+            'file',
+            'interwiki',
+            'invoke',
+            'link',
+            'property',
+            'template',
+        ],
+        site,
+    )
+    _site_exceptions[site] = exceptions
+    return exceptions
+
+
+def compile_identifiers(options):
+    """
+    Return the enabled identifiers and the compiled replacements.
+
+    @param options: identifier (e.g., ISBN) to replacement; identifiers
+        without a replacement are disabled
+    @type options: dict
+
+    @rtype: tuple of (tuple of str, dict)
+    """
+    if not _regexes:
+        _create_regexes()
+    identifiers = tuple(
+        key for key in ('ISBN', 'PMID', 'RFC') if options.get(key)
+    )
+    replacements = {
+        key: compile_replacement(options[key]) for key in identifiers
+    }
+    return identifiers, replacements
+
+
+def _local_name(tag):
+    """Return the XML tag without its namespace."""
+    return tag.rpartition('}')[2]
+
+
+def iter_dump_pages(source):
+    """
+    Yield the title and text of each non-redirect page in an XML dump.
+
+    Elements are cleared once processed, so memory use does not grow
+    with the size of the dump.
+
+    @param source: XML dump (or a fragment with a root element)
+    @type source: file-like object
+
+    @rtype: generator of tuple of (str, str)
+    """
+    context = ElementTree.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or _local_name(elem.tag) != 'page':
+            continue
+        title = text = None
+        redirect = False
+        for child in elem.iter():
+            name = _local_name(child.tag)
+            if name == 'title':
+                title = child.text
+            elif name == 'redirect':
+                redirect = True
+            elif name == 'text':
+                text = child.text or ''
+        if title and text is not None and not redirect:
+            yield title, text
+        root.clear()
+
+
+def iter_bz2_chunks(stream, size=XMLDUMP_CHUNK_SIZE):
+    """
+    Yield chunks of complete bz2 streams from a multistream bz2 file.
+
+    Each chunk (except possibly the last) is at least size bytes.
+
+    @param stream: multistream bz2 file opened in binary mode
+    @type stream: file-like object
+    @param size: number of bytes to read at a time
+    @type size: int
+
+    @rtype: generator of bytes
+    """
+    buffer = b''
+    while True:
+        data = stream.read(size)
+        if not data:
+            if buffer:
+                yield buffer
+            return
+        buffer += data
+        index = buffer.rfind(BZ2_STREAM_MAGIC, 1)
+        if index > 0:
+            yield buffer[:index]
+            buffer = buffer[index:]
+
+
+def iter_ahead(iterable, ahead):
+    """
+    Yield items from the iterable, reading up to ahead items early.
+
+    This keeps a process pool busy with the items submitted as they are
+    read while the earlier items are consumed in order.
+
+    @param iterable: items to yield
+    @type iterable: iterable
+    @param ahead: number of items to read early
+    @type ahead: int
+
+    @rtype: generator
+    """
+    queue = deque()
+    for item in iterable:
+        queue.append(item)
+        if len(queue) > ahead:
+            yield queue.popleft()
+    yield from queue
+
+
+def _transform_text(text, engine):
+    """Return the text replaced by the engine and the count."""
+    if not _regexes:
+        _create_regexes()
+    return replace_magic_links_by_section(text, *engine)
+
+
+def _would_change(text, engine):
+    """Return whether the engine would change the text."""
+    if not has_identifier(text, engine[1]):
+        return False
+    _, count = _transform_text(text, engine)
+    return count > 0
+
+
+def _scan_dump_chunk(chunk, engine):
+    """Return the titles of the pages in a bz2 chunk that would change."""
+    data = bz2.decompress(chunk)
+    start = data.find(b'<page>')
+    end = data.rfind(b'</page>')
+    if start < 0 or end < 0:
+        # e.g., the stream with the siteinfo header
+        return []
+    source = io.BytesIO(
+        b'<pages>' + data[start:end + len(b'</page>')] + b'</pages>'
+    )
+    return [
+        title for title, text in iter_dump_pages(source)
+        if _would_change(text, engine)
+    ]
+
+
+def scan_xml_dump(path, site, options, workers=None):
+    """
+    Yield the titles of the pages in an XML dump that would change.
+
+    Multistream dumps are split at the bz2 stream boundaries and the
+    chunks are decompressed and scanned by a process pool. Other dumps
+    are scanned sequentially. Titles are yielded in dump order.
+
+    @param path: path to the XML dump (.xml or .xml.bz2)
+    @type path: str
+    @param site: site used to resolve site-specific exceptions
+    @type site: L{pywikibot.site.BaseSite}
+    @param options: identifier (e.g., ISBN) to replacement
+    @type options: dict
+    @param workers: number of worker processes
+    @type workers: int or None
+
+    @rtype: generator of str
+    """
+    engine = compile_identifiers(options) + (get_replace_exceptions(site),)
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as f:
+        head = f.read(XMLDUMP_CHUNK_SIZE)
+        f.seek(0)
+        if not head.startswith(b'BZh') or head.find(BZ2_STREAM_MAGIC, 1) < 0:
+            if head.startswith(b'BZh'):
+                f = bz2.open(f)
+            for title, text in iter_dump_pages(f):
+                if _would_change(text, engine):
+                    yield title
+            return
+        # The engine is passed with each task since the pool initializer
+        # needs Python 3.7.
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = (
+                executor.submit(_scan_dump_chunk, chunk, engine)
+                for chunk in iter_bz2_chunks(f)
+            )
+            for future in iter_ahead(futures, workers):
+                yield from future.result()
+
+
 class MagicLinksReplacer(SingleSiteBot, NoRedirectPageBot, ExistingPageBot):
     """Bot to replace magic links."""
 
@@ -160,25 +580,75 @@ class MagicLinksReplacer(SingleSiteBot, NoRedirectPageBot, ExistingPageBot):
         @type generator: generator
         """
         self.availableOptions.update(
-            {'summary': None, 'ISBN': None, 'PMID': None, 'RFC': None}
+            {
+                'summary': None,
+                'ISBN': None,
+                'PMID': None,
+                'RFC': None,
+                'workers': None,
+            }
         )
-        self.generator = generator
+        self.generator = self.transform_generator(generator)
         super().__init__(**kwargs)
-        _create_regexes()
-        self.replace_exceptions = [
-            _regexes[key]
-            for key in ('bare_url', 'bracket_url', 'tags_content', 'tags')
-        ]
-        self.replace_exceptions += [
-            'category',
-            'comment',
-            'file',
-            'interwiki',
-            'invoke',
-            'link',
-            'property',
-            'template',
-        ]
+        self.transforms = dict()
+        self.replace_exceptions = get_replace_exceptions(self.site)
+        self.identifiers, self.replacements = compile_identifiers(
+            {key: self.getOption(key) for key in ('ISBN', 'PMID', 'RFC')}
+        )
+        self.prefilter_skips = 0
+
+    def skip_page(self, page):
+        """Skip the page if it does not contain any identifier."""
+        if super().skip_page(page):
+            self.transforms.pop(page, None)
+            return True
+        if not has_identifier(page.text, self.replacements):
+            self.prefilter_skips += 1
+            return True
+        if page not in self.transforms:
+            return True
+        return False
+
+    def transform_generator(self, generator):
+        """
+        Yield items from the generator while replacing ahead.
+
+        The text of pages with identifiers is replaced on a process
+        pool, up to the number of workers ahead of the page being
+        treated. Items are yielded in order.
+
+        @param generator: the page generator that determines on which
+            pages to work
+        @type generator: generator
+        """
+        workers = self.getOption('workers') or os.cpu_count() or 1
+        engine = (self.identifiers, self.replacements, self.replace_exceptions)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from iter_ahead(
+                self._submit_transforms(generator, executor, engine), workers
+            )
+
+    def _submit_transforms(self, generator, executor, engine):
+        """Yield items from the generator after submitting their pages."""
+        for item in generator:
+            page = self.init_page(item)
+            if (
+                page.exists()
+                and not page.isRedirectPage()
+                and has_identifier(page.text, self.replacements)
+            ):
+                self.transforms[page] = executor.submit(
+                    _transform_text, page.text, engine
+                )
+            yield item
+
+    def teardown(self):
+        """Log the number of pages skipped by the identifier check."""
+        pywikibot.output(
+            '{} pages without identifiers skipped.'.format(
+                self.prefilter_skips
+            )
+        )
 
     def check_disabled(self):
         """Check if the task is disabled. If so, quit."""
@@ -202,18 +672,9 @@ class MagicLinksReplacer(SingleSiteBot, NoRedirectPageBot, ExistingPageBot):
     def treat_page(self):
         """Process one page."""
         self.check_disabled()
-        text = ''
-        for section in split_into_sections(self.current_page.text):
-            for identifier in ('ISBN', 'PMID', 'RFC'):
-                if self.getOption(identifier):
-                    section = replaceExcept(
-                        section,
-                        _regexes[identifier],
-                        self.getOption(identifier),
-                        self.replace_exceptions,
-                        site=self.site,
-                    )
-            text += section
+        text, count = self.transforms.pop(self.current_page).result()
+        if not count:
+            return
         self.put_current(text, summary=self.getOption('summary'))
 
 
@@ -234,7 +695,7 @@ def main(*args):
             continue
         arg, _, value = arg.partition(':')
         arg = arg[1:]
-        if arg == 'config':
+        if arg in ('config', 'xmldump', 'workers'):
             if not value:
                 value = pywikibot.input(
                     'Please enter a value for {}'.format(arg), default=None
@@ -242,7 +703,6 @@ def main(*args):
             options[arg] = value
         else:
             options[arg] = True
-    gen = gen_factory.getCombinedGenerator(preload=True)
     if 'config' not in options:
         pywikibot.bot.suggest_help(missing_parameters=['config'])
         return False
@@ -252,6 +712,21 @@ def main(*args):
     else:
         pywikibot.error('Invalid config.')
         return False
+    try:
+        options['workers'] = int(options.get('workers', 0)) or None
+    except ValueError:
+        pywikibot.error('-workers must be an integer.')
+        return False
+    if 'xmldump' in options:
+        count = 0
+        for title in scan_xml_dump(
+            options.pop('xmldump'), site, options, options['workers']
+        ):
+            pywikibot.stdout(title)
+            count += 1
+        pywikibot.output('{} pages would be changed.'.format(count))
+        return True
+    gen = gen_factory.getCombinedGenerator(preload=True)
     MagicLinksReplacer(gen, site=site, **options).run()
     return True
 